@@ -0,0 +1,481 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##########
+## bench_thrunc.py
+##
+## Benchmarks for thrunc.py, run against a local stub of the RNC search
+## server so that no requests are sent to ruscorpora.ru.
+##
+## License: MIT ( http://opensource.org/licenses/MIT )
+##########
+
+"""Local stub RNC server and benchmarks for thrunc."""
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import urlsplit, parse_qs
+import threading
+import time
+import gzip
+import glob
+import json
+import os
+import shutil
+import tempfile
+import StringIO
+
+import thrunc
+
+def make_results_page(documents, contexts, sources, lang="en"):
+    """Return the HTML of an RNC results page.
+
+    Parameters
+    ----------
+      documents (int): total number of documents found by the query
+      contexts (int): total number of contexts found by the query
+      sources (list): (source_name, examples) tuples listed on this page,
+        or (source_name, examples, hits) to also show examples with the
+        words of hits highlighted; sources with examples=None have no
+        "All N" link
+      lang (str): 'en' or 'ru', the language of the "All N" links
+    """
+    if lang == "ru":
+        all_label = u"Все примеры ({})"
+    else:
+        all_label = u"All examples ({})"
+
+    def number(n):
+        return u"{:,}".format(n).replace(u",", u" ")
+
+    items = []
+    for source in sources:
+        name, examples = source[:2]
+        hits = source[2] if len(source) > 2 else []
+        snippets = u"".join(
+            u'<div class="b-snippet">... <span class="b-wrd-expl g-em">'
+            u'{}</span> ...</div>'.format(hit) for hit in hits)
+        if examples is None:
+            link = u""
+        else:
+            link = u' <a href="#">{}</a>'.format(all_label.format(examples))
+        items.append(
+            u'<li><span class="b-doc-expl">{}</span> '
+            u'<a href="#">[doc]</a>{}{}</li>'.format(name, link, snippets)
+            )
+    page = (
+        u'<html><head><title>RNC</title></head><body>'
+        u'<div></div><div></div>'
+        u'<div><p></p><p></p><p></p>'
+        u'<p>Found <span>{}</span> documents, <span> </span>'
+        u'<span>{}</span> contexts.</p>'
+        u'<ol>{}</ol></div>'
+        u'</body></html>'
+        ).format(number(documents), number(contexts), u"".join(items))
+    return page.encode("utf-8")
+
+class StubRNCHandler(BaseHTTPRequestHandler):
+    """Serve synthetic results pages for /search.xml?...&p=N& urls.
+
+    A search term 'a|b' lists the sources of a and then those of b, with
+    each example of a source shown with its term highlighted. Terms of
+    the server's shared tuple also have one source in common, with one
+    example of each, which lists them all but only shows the first.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        if self.server.connect_latency:
+            time.sleep(self.server.connect_latency)
+
+    def do_GET(self):
+        server = self.server
+        if server.count_request() <= server.fail_first:
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if server.latency:
+            time.sleep(server.latency)
+        params = parse_qs(urlsplit(self.path).query)
+        term = (params.get("lex1") or params.get("lexi1")
+                or params.get("req") or [""])[0]
+        page_idx = int(params.get("p", ["0"])[0])
+        dpp = int(params.get("dpp", [""])[0] or server.default_dpp)
+        dpp = min(dpp, server.max_dpp)
+        terms = term.split("|") if server.alternation else [term]
+        listing = []
+        for t in terms:
+            listing.extend((t.decode("utf-8"), i) for i in range(
+                server.totals.get(t, server.default_documents)))
+        shared = [t.decode("utf-8") for t in terms if t in server.shared]
+        if shared:
+            listing.append((shared, None))
+        documents = len(listing)
+        first = page_idx * dpp
+        sources = []
+        for t, i in listing[first:first + dpp]:
+            if i is None:
+                sources.append((u"Shared source (1750-1760)", len(t),
+                                t[:1]))
+                continue
+            examples = 1 + i % 3
+            shown = examples
+            if server.max_snippets is not None:
+                shown = min(examples, server.max_snippets)
+            sources.append((u"Source {} ({}-{})".format(i, 1700 + i % 100,
+                            1710 + i % 100),
+                            examples if server.all_links else None,
+                            [t] * shown if server.highlight else []))
+        body = make_results_page(documents=documents,
+            contexts=documents * 2, sources=sources)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if server.compress and "gzip" in self.headers.get(
+                "Accept-Encoding", ""):
+            buf = StringIO.StringIO()
+            with gzip.GzipFile(fileobj=buf, mode="wb") as stream:
+                stream.write(body)
+            body = buf.getvalue()
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubRNCServer(ThreadingMixIn, HTTPServer):
+    """Local stand-in for search.ruscorpora.ru, run in a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, totals=None, default_documents=25, default_dpp=10,
+                 max_dpp=10, latency=0.0, connect_latency=0.0,
+                 compress=True, fail_first=0, highlight=True,
+                 max_snippets=None, alternation=True,
+                 host_budget=(10000.0, 100), shared=(), all_links=True):
+        """Start the server on a free port of 127.0.0.1.
+
+        Parameters
+        ----------
+          totals (dict): number of documents found for each search term
+          default_documents (int): documents found for any other term
+          default_dpp (int): documents per page when the url has no dpp
+          max_dpp (int): largest page size the server honours
+          latency (float): seconds to wait before answering each request
+          connect_latency (float): seconds added to every new connection,
+            standing in for the DNS lookup and handshakes of a remote host
+          compress (bool): gzip responses to clients that accept it
+          fail_first (int): answer the first fail_first requests with
+            503 Service Unavailable and Retry-After: 1
+          highlight (bool): show the examples with highlighted hits
+          max_snippets (int): largest number of examples shown for each
+            source (default: all of them)
+          alternation (bool): search for a and for b given 'a|b', rather
+            than for the literal term
+          host_budget (tuple): requests per second and burst size thrunc
+            allows itself against the server (see thrunc.HOST_BUDGETS)
+          shared (tuple): terms found together in one more source, which
+            only shows an example of the first of them
+          all_links (bool): give sources an "All N" link (without one,
+            thrunc does not count them)
+        """
+        HTTPServer.__init__(self, ("127.0.0.1", 0), StubRNCHandler)
+        self.totals = totals or {}
+        self.default_documents = default_documents
+        self.default_dpp = default_dpp
+        self.max_dpp = max_dpp
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.compress = compress
+        self.fail_first = fail_first
+        self.highlight = highlight
+        self.max_snippets = max_snippets
+        self.alternation = alternation
+        self.shared = shared
+        self.all_links = all_links
+        self.requests = 0
+        self.requests_lock = threading.Lock()
+        host = "127.0.0.1:{}".format(self.server_port)
+        thrunc.HOST_BUDGETS[host] = host_budget
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        """Base url to use in place of RNCQuery*.base_url."""
+        return "http://127.0.0.1:{}/search.xml?".format(self.server_port)
+
+    def count_request(self):
+        """Count a request and return the running total."""
+        with self.requests_lock:
+            self.requests += 1
+            return self.requests
+
+    def stop(self):
+        ## drop pooled keep-alive connections so handler threads can exit
+        thrunc.SESSION.close()
+        self.shutdown()
+        self.server_close()
+
+def unpaced():
+    """Return an AdaptivePacer that lets the stub server run at full speed."""
+    return thrunc.AdaptivePacer(initial_delay=0, min_delay=0)
+
+def stub_search(server, term):
+    """Return an RNCSearch of the modern subcorpus aimed at server."""
+    query = thrunc.RNCQueryModern(lex1=term, gramm1="praet")
+    query.base_url = server.base_url
+    return thrunc.RNCSearch(rnc_query=query, subcorpus="Modern", lem=term,
+                            gramm_cat="praet")
+
+def bench_concurrent_fetch(n_searches=8, workers=4, latency=0.2):
+    """Compare serial and concurrent scraping of n_searches queries.
+
+    Both runs use the same per-host politeness budget, so the difference
+    is the time that serial scraping spends waiting on the server.
+    """
+    server = StubRNCServer(default_documents=25, latency=latency,
+                           host_budget=(20.0, 4))
+    thrunc.PACER = unpaced()
+    try:
+        searches = [stub_search(server, "term{}".format(i))
+                    for i in range(n_searches)]
+        start = time.time()
+        for s in searches:
+            s.scrape_pages()
+        serial = time.time() - start
+
+        searches = [stub_search(server, "term{}".format(i))
+                    for i in range(n_searches)]
+        start = time.time()
+        thrunc.ConcurrentFetcher(workers=workers).scrape_searches(searches)
+        concurrent = time.time() - start
+    finally:
+        server.stop()
+
+    print "serial:     {:.2f} s".format(serial)
+    print "concurrent: {:.2f} s ({} workers)".format(concurrent, workers)
+
+def bench_session(n_requests=300, connect_latency=0.02):
+    """Compare requests per second of MyOpener and the pooled HTTPSession.
+
+    connect_latency is charged once per TCP connection by the stub server,
+    which is what a fresh MyOpener pays on every page of the real corpus.
+    """
+    server = StubRNCServer(default_documents=10,
+                           connect_latency=connect_latency)
+    url = server.base_url + "lex1=term&p=0&"
+    try:
+        start = time.time()
+        for i in range(n_requests):
+            thrunc.MyOpener().open(url).read()
+        before = n_requests / (time.time() - start)
+
+        session = thrunc.HTTPSession()
+        start = time.time()
+        for i in range(n_requests):
+            session.get(url)
+        after = n_requests / (time.time() - start)
+        session.close()
+    finally:
+        server.stop()
+
+    print "MyOpener per page:    {:.0f} requests/s".format(before)
+    print "shared HTTPSession:   {:.0f} requests/s".format(after)
+
+def bench_extraction(pattern=None, n_pages=20, rounds=5):
+    """Compare ResultsPage with BeautifulSoup + scrape_one_page + lxml totals.
+
+    Parameters
+    ----------
+      pattern (str): glob of saved RNC results pages (e.g., 'pages/*.html').
+        If None, n_pages synthetic pages of 10 sources each are used.
+      rounds (int): number of passes over the pages for each method
+    """
+    if pattern is not None:
+        pages = []
+        for name in sorted(glob.glob(pattern)):
+            with open(name, "rb") as stream:
+                pages.append(stream.read())
+    else:
+        pages = [make_results_page(documents=1000, contexts=2000,
+                 sources=[(u"Источник {} (1750-1760)".format(i), i)
+                          for i in range(10)], lang="ru")
+                 for p in range(n_pages)]
+    if not pages:
+        print "No pages match {}".format(pattern)
+        return
+
+    query = thrunc.RNCQueryModern(lex1="term")
+    start = time.time()
+    for r in range(rounds):
+        old = thrunc.RNCSearch(rnc_query=query)
+        for idx, page_html in enumerate(pages):
+            soup = thrunc.Soup(page_html, "lxml")
+            if soup.ol and soup.ol.find_all('li'):
+                old.scrape_one_page(soup=soup, idx=idx)
+            tree = thrunc.html.fromstring(thrunc.decode_html(page_html))
+            tree.xpath('/html/body/div[3]/p[4]/span[1]/text()')
+            tree.xpath('/html/body/div[3]/p[4]/span[3]/text()')
+    before = (time.time() - start) / (rounds * len(pages))
+
+    start = time.time()
+    for r in range(rounds):
+        new = thrunc.RNCSearch(rnc_query=query)
+        for idx, page_html in enumerate(pages):
+            new.scrape_results_page(thrunc.ResultsPage(page_html), idx=idx)
+    after = (time.time() - start) / (rounds * len(pages))
+
+    assert old.all_search_results == new.all_search_results
+    print "soup + lxml:  {:.2f} ms/page".format(before * 1000)
+    print "ResultsPage:  {:.2f} ms/page".format(after * 1000)
+
+def bench_query_batching(verb="брать", totals=None, max_snippets=None):
+    """Compare requests made by one search per form and by QueryPlanner.
+
+    The searches are those of RNCSearchTerm.search_old for every prefix
+    spelling of verb. By default only a few of the forms have results,
+    as in the corpus, where most spellings of most verbs are never used.
+
+    With max_snippets, sources show only a sample of their examples, as
+    in the corpus; QueryPlanner then cannot split the batches that find
+    something and searches their forms again one by one.
+    """
+    if totals is None:
+        totals = {verb: 25, "вз" + verb: 12, "со" + verb: 30,
+                  "раз" + verb: 3}
+    ## the frequent word QueryPlanner checks alternations with
+    totals.setdefault("и", 1000)
+    server = StubRNCServer(totals=totals, default_documents=0,
+                           max_snippets=max_snippets)
+    thrunc.PACER = unpaced()
+
+    def searches():
+        for pfx, forms in thrunc.RussianVerb(verb).all_forms_by_prefix:
+            for form in forms:
+                query = thrunc.RNCQueryOld(req=form)
+                query.base_url = server.base_url
+                yield thrunc.RNCSearch(rnc_query=query, subcorpus="Old",
+                                       prefix=pfx, lem=form)
+
+    def rows(search):
+        ## the page index of a row depends on how the query was paged
+        return sorted((r[3], r[6], r[9], r[13])
+                      for r in search.all_search_results)
+
+    try:
+        before = server.requests
+        one_by_one = list(searches())
+        for search in one_by_one:
+            search.scrape_pages()
+        single = server.requests - before
+
+        before = server.requests
+        planned = list(thrunc.QueryPlanner().scrape(searches()))
+        merged = server.requests - before
+    finally:
+        server.stop()
+
+    assert map(rows, one_by_one) == map(rows, planned)
+    print "one query per form: {} requests ({} forms)".format(
+        single, len(one_by_one))
+    print "QueryPlanner:       {} requests ({} examples shown)".format(
+        merged, "all" if max_snippets is None else max_snippets)
+
+def bench_page_size(fixture=None, max_dpp=50):
+    """Compare pages per query with the default and the negotiated page size.
+
+    Parameters
+    ----------
+      fixture (str): JSON file of {term: number of documents}, e.g., totals
+        recorded from real queries. If None, 40 terms with Zipf-distributed
+        totals (3000, 1500, 1000, ...) are used.
+      max_dpp (int): largest page size the stub server honours
+    """
+    if fixture is not None:
+        with open(fixture) as stream:
+            totals = dict((k.encode("utf-8"), v)
+                          for k, v in json.load(stream).iteritems())
+    else:
+        totals = dict(("term{}".format(r), 3000 // r) for r in range(1, 41))
+    totals["быть"] = 10000
+    server = StubRNCServer(totals=totals, max_dpp=max_dpp)
+    thrunc.PACER = unpaced()
+    terms = sorted(t for t in totals if t != "быть")
+
+    def pages_per_query():
+        pages = []
+        for term in terms:
+            before = server.requests
+            stub_search(server, term).scrape_pages()
+            pages.append(server.requests - before)
+        return pages
+
+    try:
+        thrunc.RNCQueryModern.default_dpp = None
+        before = pages_per_query()
+        size = thrunc.negotiate_page_size(thrunc.RNCQueryModern,
+                                          {"lex1": "быть"},
+                                          base_url=server.base_url)
+        after = pages_per_query()
+    finally:
+        thrunc.RNCQueryModern.default_dpp = None
+        server.stop()
+
+    for label, pages in [("default page size:", before),
+                         ("{} per page:".format(size), after)]:
+        print "{:<19} {:.1f} pages/query (max {}, total {})".format(
+            label, float(sum(pages)) / len(pages), max(pages), sum(pages))
+
+def bench_run_for_real(verb=u"читать", prefixes=(u"", u"по", u"про")):
+    """Time run_for_real on a search list of Cyrillic verbs, checkpointed.
+
+    The search list, page checkpoint and page urls all hold Cyrillic
+    text, as in a real crawl.
+    """
+    server = StubRNCServer(totals={}, default_documents=25)
+    thrunc.PACER = unpaced()
+    directory = tempfile.mkdtemp()
+    xml_name = os.path.join(directory, "bench.xml")
+    base_url = thrunc.RNCQueryModern.base_url
+    try:
+        with thrunc.SearchList(file_name=xml_name) as search_list:
+            for pfx in prefixes:
+                search_list.add_search_to_list(
+                    base_verb=verb, derived_verb=pfx + verb, dv_pfx=pfx,
+                    dv_pfx_name=u"{}-".format(pfx) if pfx else u"—")
+        thrunc.RNCQueryModern.base_url = server.base_url
+        start = time.time()
+        thrunc.run_for_real(xml_name, negotiate=False)
+        elapsed = time.time() - start
+        pending = list(thrunc.SearchList(file_name=xml_name)
+                       .pending_queries())
+    finally:
+        thrunc.RNCQueryModern.base_url = base_url
+        for name in ("PAGE_CHECKPOINT", "NEGATIVE_CACHE",
+                     "RESPONSE_CACHE"):
+            if getattr(thrunc, name) is not None:
+                getattr(thrunc, name).close()
+                setattr(thrunc, name, None)
+        server.stop()
+        shutil.rmtree(directory)
+
+    assert not pending
+    print "run_for_real: {} queries, {} requests in {:.2f} s".format(
+        len(prefixes), server.requests, elapsed)
+
+if __name__ == "__main__":
+    bench_concurrent_fetch()
+    bench_session()
+    bench_extraction()
+    bench_query_batching()
+    bench_query_batching(max_snippets=1)
+    bench_page_size()
+    bench_run_for_real()
@@ -0,0 +1,302 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+##########
+## test_thrunc.py
+##
+## Unit tests for thrunc.py, run against the local stub of the RNC search
+## server in bench_thrunc.py, so that no requests are sent to
+## ruscorpora.ru. Run with `python -m unittest test_thrunc` or pytest.
+##
+## License: MIT ( http://opensource.org/licenses/MIT )
+##########
+
+"""Unit tests for thrunc."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import thrunc
+from bench_thrunc import StubRNCServer, stub_search, unpaced
+
+## forms searched for by the QueryPlanner tests, and the documents found
+FORMS = ["брал", "взбрал", "собрал", "разбрал", "перебрал"]
+TOTALS = {"брал": 25, "собрал": 12, "разбрал": 3,
+          ## the frequent word QueryPlanner checks alternations with
+          "и": 1000}
+
+def old_searches(server, forms=FORMS):
+    """Return an (unscraped) RNCSearch of the old subcorpus for each form."""
+    searches = []
+    for form in forms:
+        query = thrunc.RNCQueryOld(req=form)
+        query.base_url = server.base_url
+        searches.append(thrunc.RNCSearch(rnc_query=query, subcorpus="Old",
+                                         lem=form))
+    return searches
+
+def rows(search):
+    """Return the rows of search that do not depend on how it was paged."""
+    return sorted((r[3], r[9], r[13]) for r in search.all_search_results)
+
+class StubTestCase(unittest.TestCase):
+    """Base class of tests that run against a StubRNCServer."""
+
+    def setUp(self):
+        self.pacer = thrunc.PACER
+        thrunc.PACER = unpaced()
+        self.directory = tempfile.mkdtemp()
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+        thrunc.PACER = self.pacer
+        shutil.rmtree(self.directory)
+
+    def start_server(self, **kwargs):
+        self.server = StubRNCServer(**kwargs)
+        return self.server
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+class QueryPlannerTest(StubTestCase):
+
+    def one_by_one(self):
+        searches = old_searches(self.server)
+        for search in searches:
+            search.scrape_pages()
+        return searches
+
+    def planned(self, negative_cache=None):
+        before = self.server.requests
+        searches = list(thrunc.QueryPlanner().scrape(
+            old_searches(self.server), negative_cache=negative_cache))
+        return searches, self.server.requests - before
+
+    def test_split_all_examples_shown(self):
+        self.start_server(totals=TOTALS, default_documents=0)
+        before = self.server.requests
+        expected = self.one_by_one()
+        single = self.server.requests - before
+        searches, merged = self.planned()
+        self.assertEqual(map(rows, searches), map(rows, expected))
+        self.assertEqual([s.documents for s in searches],
+                         [s.documents for s in expected])
+        self.assertLess(merged, single)
+
+    def test_shared_source_falls_back(self):
+        ## one source lists both forms but only shows an example of the
+        ## first, so the batch must be searched again form by form
+        self.start_server(totals=TOTALS, default_documents=0,
+                          shared=("брал", "собрал"))
+        expected = self.one_by_one()
+        searches, merged = self.planned()
+        self.assertEqual(map(rows, searches), map(rows, expected))
+        self.assertEqual([s.documents for s in searches],
+                         [s.documents for s in expected])
+        self.assertEqual([s.contexts for s in searches],
+                         [s.contexts for s in expected])
+
+    def test_sources_without_links_are_not_cached_as_empty(self):
+        self.start_server(totals=TOTALS, default_documents=0,
+                          all_links=False)
+        negative_cache = thrunc.NegativeCache(self.path("empty.db"))
+        try:
+            expected = self.one_by_one()
+            searches, merged = self.planned(negative_cache)
+            for search in searches:
+                found = TOTALS.get(search.params["req"], 0) > 0
+                self.assertEqual(negative_cache.is_empty(search.params),
+                                 not found)
+        finally:
+            negative_cache.close()
+        self.assertEqual([s.documents for s in searches],
+                         [s.documents for s in expected])
+
+    def test_literal_alternation(self):
+        ## a server that reads 'a|b' literally finds nothing for it
+        self.start_server(totals=TOTALS, default_documents=0,
+                          alternation=False)
+        negative_cache = thrunc.NegativeCache(self.path("empty.db"))
+        planner = thrunc.QueryPlanner()
+        try:
+            expected = self.one_by_one()
+            searches = list(planner.scrape(old_searches(self.server),
+                                           negative_cache=negative_cache))
+            self.assertFalse(negative_cache.is_empty(searches[0].params))
+        finally:
+            negative_cache.close()
+        self.assertFalse(planner._mergeable(searches[0]))
+        self.assertEqual(map(rows, searches), map(rows, expected))
+
+class NegotiatePageSizeTest(StubTestCase):
+
+    def setUp(self):
+        StubTestCase.setUp(self)
+        self.default_dpp = thrunc.RNCQueryModern.default_dpp
+
+    def tearDown(self):
+        thrunc.RNCQueryModern.default_dpp = self.default_dpp
+        StubTestCase.tearDown(self)
+
+    def test_capped_size(self):
+        self.start_server(totals={"быть": 10000}, max_dpp=50)
+        size = thrunc.negotiate_page_size(thrunc.RNCQueryModern,
+                                          {"lex1": "быть"},
+                                          base_url=self.server.base_url)
+        self.assertEqual(size, 50)
+        self.assertEqual(thrunc.RNCQueryModern.default_dpp, 50)
+
+    def test_empty_probe(self):
+        ## a page that lists nothing confirms no page size
+        self.start_server(totals={"быть": 0}, max_dpp=50)
+        thrunc.RNCQueryModern.default_dpp = 20
+        size = thrunc.negotiate_page_size(thrunc.RNCQueryModern,
+                                          {"lex1": "быть"},
+                                          base_url=self.server.base_url)
+        self.assertIsNone(size)
+        self.assertEqual(thrunc.RNCQueryModern.default_dpp, 20)
+
+class NegativeCacheTest(StubTestCase):
+
+    def setUp(self):
+        StubTestCase.setUp(self)
+        self.cache = thrunc.NegativeCache(self.path("empty.db"))
+
+    def tearDown(self):
+        self.cache.close()
+        StubTestCase.tearDown(self)
+
+    def test_add(self):
+        self.assertFalse(self.cache.is_empty({"lex1": "брать"}))
+        self.cache.add({"lex1": "брать"})
+        self.assertTrue(self.cache.is_empty({"lex1": u"брать"}))
+        self.assertFalse(self.cache.is_empty({"lex1": "взять"}))
+
+    def test_query_key_ignores_paging(self):
+        self.assertEqual(thrunc.query_key({"lex1": "брать", "dpp": 10}),
+                         thrunc.query_key({"lex1": u"брать", "dpp": "50",
+                                           "p": 2}))
+        self.cache.add({"lex1": "брать", "dpp": 10})
+        self.assertTrue(self.cache.is_empty({"lex1": "брать", "dpp": 50}))
+
+    def test_ttl(self):
+        self.cache.ttl = 60.0
+        self.cache.add({"lex1": "брать"})
+        self.assertTrue(self.cache.is_empty({"lex1": "брать"}))
+        with self.cache.conn:
+            self.cache.conn.execute(u"UPDATE empty SET created = ?",
+                                    (time.time() - 120.0,))
+        self.assertFalse(self.cache.is_empty({"lex1": "брать"}))
+
+    def test_skips_request(self):
+        self.start_server(totals={"брать": 0})
+        stub_search(self.server, "брать").scrape_pages(
+            negative_cache=self.cache)
+        before = self.server.requests
+        search = stub_search(self.server, "брать")
+        search.scrape_pages(negative_cache=self.cache)
+        self.assertEqual(self.server.requests, before)
+        self.assertEqual(search.documents, 0)
+
+class PageCheckpointTest(StubTestCase):
+
+    def setUp(self):
+        StubTestCase.setUp(self)
+        self.checkpoint = thrunc.PageCheckpoint(self.path("pages.db"))
+
+    def tearDown(self):
+        self.checkpoint.close()
+        StubTestCase.tearDown(self)
+
+    def interrupted_search(self, term, pages):
+        """Scrape term, then forget all but its first pages, as if killed."""
+        search = stub_search(self.server, term)
+        search.scrape_pages(checkpoint=self.checkpoint)
+        with self.checkpoint.conn:
+            self.checkpoint.conn.execute(
+                u"UPDATE searches SET finished = 0")
+            self.checkpoint.conn.execute(
+                u"DELETE FROM pages WHERE pageIndex >= ?", (pages,))
+        return search
+
+    def test_resume(self):
+        self.start_server(default_documents=25)
+        complete = self.interrupted_search("читать", 2)
+        before = self.server.requests
+        search = stub_search(self.server, "читать")
+        search.scrape_pages(checkpoint=self.checkpoint)
+        ## only page 2 of 0-2 is fetched again
+        self.assertEqual(self.server.requests - before, 1)
+        self.assertEqual(search.all_search_results,
+                         complete.all_search_results)
+        self.assertEqual(search.documents, 25)
+
+    def test_resume_counts_listed_documents(self):
+        ## sources without an "All N" link give no rows, but are listed
+        self.start_server(default_documents=25, all_links=False)
+        interrupted = self.interrupted_search("читать", 2)
+        state = self.checkpoint.load(interrupted.checkpoint_key)
+        self.assertEqual(state[3], [[], []])
+        self.assertEqual(state[4], 20)
+        ## so page 2 completes the count, and no empty page is fetched
+        before = self.server.requests
+        search = stub_search(self.server, "читать")
+        search.scrape_pages(checkpoint=self.checkpoint)
+        self.assertEqual(self.server.requests - before, 1)
+
+    def test_discard(self):
+        self.start_server(default_documents=25)
+        search = stub_search(self.server, "читать")
+        search.scrape_pages(checkpoint=self.checkpoint)
+        self.assertIsNotNone(self.checkpoint.load(search.checkpoint_key))
+        search.discard_checkpoint()
+        self.assertIsNone(self.checkpoint.load(search.checkpoint_key))
+
+class ResponseCacheTest(StubTestCase):
+
+    def setUp(self):
+        StubTestCase.setUp(self)
+        self.cache = thrunc.ResponseCache(self.path("cache.db"))
+
+    def tearDown(self):
+        self.cache.close()
+        StubTestCase.tearDown(self)
+
+    def test_evicts_least_recently_used(self):
+        ## random bytes do not compress, so each page takes ~1000 bytes
+        bodies = dict(("http://rnc/?p={}&".format(i), os.urandom(1000))
+                      for i in range(3))
+        urls = sorted(bodies)
+        self.cache.max_bytes = 2500
+        self.cache.put(urls[0], bodies[urls[0]])
+        time.sleep(0.01)
+        self.cache.put(urls[1], bodies[urls[1]])
+        time.sleep(0.01)
+        self.assertEqual(self.cache.get(urls[0]), bodies[urls[0]])
+        time.sleep(0.01)
+        self.cache.put(urls[2], bodies[urls[2]])
+        self.assertEqual(self.cache.get(urls[0]), bodies[urls[0]])
+        self.assertIsNone(self.cache.get(urls[1]))
+        self.assertEqual(self.cache.get(urls[2]), bodies[urls[2]])
+
+    def test_ttl(self):
+        self.cache.ttl = 60.0
+        self.cache.put("http://rnc/?p=0&", "page")
+        self.assertEqual(self.cache.get("http://rnc/?p=0&"), "page")
+        with self.cache.conn:
+            self.cache.conn.execute(u"UPDATE pages SET created = ?",
+                                    (time.time() - 120.0,))
+        self.assertIsNone(self.cache.get("http://rnc/?p=0&"))
+
+    def test_key_ignores_parameter_order(self):
+        self.cache.put("http://rnc/?b=2&a=1&", "page")
+        self.assertEqual(self.cache.get("http://rnc/?a=1&b=2"), "page")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -35,23 +35,181 @@
 
 """Return frequency and year for items in the historical corpora of the RNC."""
 
-from urllib import FancyURLopener
+from urllib import FancyURLopener, urlencode, quote
+from urlparse import urlsplit, urlunsplit, urljoin, parse_qsl
 from bs4 import BeautifulSoup as Soup
 from lxml import html
 import re
 import sys
+import zlib
+import socket
+import httplib
+import hashlib
+from email.utils import parsedate_tz, mktime_tz
+from xml.sax.saxutils import quoteattr
 import time
+import Queue
+import threading
 import sqlite3
+import os
+import stat
 import codecs
 import random
+import tempfile
+import uuid
+import json
+import functools
+import itertools
+from collections import OrderedDict
+import csv
+import gzip
+import logging
+import logging.handlers
 import openpyxl
 
 try:
     import xml.etree.cElementTree as ET
 except ImportError as e:
-    print "ImportError: {}\nUsing non-C implementation of ET".format(e)
     import xml.etree.ElementTree as ET
 
+## pyarrow is only needed by ParquetExporter
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+## thrunc logs through the "thrunc" logger and stays silent unless the
+## application (or configure_logging) attaches a handler
+log = logging.getLogger("thrunc")
+log.addHandler(logging.NullHandler())
+
+class BufferedHandler(logging.handlers.MemoryHandler):
+    """MemoryHandler that also flushes every flush_interval seconds.
+
+    Records are written to the target in batches, so a busy crawl does not
+    pay for one console write per record, but warnings and errors are still
+    written out at once. A background thread flushes the buffer when no
+    record has arrived for flush_interval seconds.
+    """
+
+    def __init__(self, target, capacity=1000, flush_interval=2.0,
+                 flush_level=logging.WARNING):
+        """Buffer records for target.
+
+        Parameters
+        ----------
+          target (logging.Handler): handler that records are flushed to
+          capacity (int): number of records buffered before a flush
+          flush_interval (float): seconds between flushes
+          flush_level (int): records at this level or above flush at once
+        """
+        logging.handlers.MemoryHandler.__init__(self, capacity,
+                                                flushLevel=flush_level,
+                                                target=target)
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_periodically)
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def _flush_periodically(self):
+        while not self.stopped.wait(self.flush_interval):
+            if time.time() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def shouldFlush(self, record):
+        return (logging.handlers.MemoryHandler.shouldFlush(self, record)
+                or time.time() - self.last_flush >= self.flush_interval)
+
+    def flush(self):
+        logging.handlers.MemoryHandler.flush(self)
+        self.last_flush = time.time()
+
+    def close(self):
+        self.stopped.set()
+        if self.flusher is not threading.current_thread():
+            self.flusher.join()
+        logging.handlers.MemoryHandler.close(self)
+
+def configure_logging(level=logging.INFO, stream=None, capacity=1000,
+                      flush_interval=2.0):
+    """Send thrunc's log records to stream through a BufferedHandler.
+
+    Nothing is logged until this (or another handler set up by the
+    application) is called, so scripts that use run_for_real or
+    RNCSearchTerm.search_all should call it first to see warnings,
+    errors and progress summaries.
+
+    Parameters
+    ----------
+      level (int): lowest level logged, e.g., logging.DEBUG to also log
+        every url fetched and every row written
+      stream (file): where records are written (default: sys.stderr)
+      capacity, flush_interval: see BufferedHandler
+
+    Returns
+    -------
+      the BufferedHandler, which is flushed and closed at exit
+    """
+    target = logging.StreamHandler(stream)
+    target.setFormatter(logging.Formatter(
+        u"%(asctime)s %(levelname)s %(message)s"))
+    handler = BufferedHandler(target, capacity=capacity,
+                              flush_interval=flush_interval)
+    log.addHandler(handler)
+    log.setLevel(level)
+    return handler
+
+class ProgressReporter(object):
+    """Periodic summary of crawl throughput, logged at INFO level."""
+
+    def __init__(self, interval=30.0):
+        """Log a summary at most every interval seconds.
+
+        Parameters
+        ----------
+          interval (float): seconds between summaries
+        """
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pages = 0
+        self.rows = 0
+        self.queue_depth = None
+        self.started = self.last_report = time.time()
+        self.last_pages = self.last_rows = 0
+
+    def add(self, pages=0, rows=0, queue_depth=None):
+        """Count scraped pages and rows, and log a summary when it is due.
+
+        Parameters
+        ----------
+          pages (int): results pages fetched
+          rows (int): result rows scraped or written
+          queue_depth (int): number of queries still to run, if known
+        """
+        with self.lock:
+            self.pages += pages
+            self.rows += rows
+            if queue_depth is not None:
+                self.queue_depth = queue_depth
+            now = time.time()
+            if now - self.last_report < self.interval:
+                return
+            elapsed = now - self.last_report
+            pages_rate = (self.pages - self.last_pages) / elapsed
+            rows_rate = (self.rows - self.last_rows) / elapsed
+            self.last_report = now
+            self.last_pages, self.last_rows = self.pages, self.rows
+            queue_depth = self.queue_depth
+        log.info(u"%d pages (%.1f/s), %d rows (%.1f/s), queue depth %s",
+                 self.pages, pages_rate, self.rows, rows_rate,
+                 u"?" if queue_depth is None else queue_depth)
+
+## progress of every scrape in this process
+PROGRESS = ProgressReporter()
+
 def to_unicode_or_bust(obj, encoding='utf-8'):
     ## by Kumar McMillan ( http://farmdev.com/talks/unicode/ )
     """Ensure that an object is unicode."""
@@ -60,18 +218,321 @@ def to_unicode_or_bust(obj, encoding='utf-8'):
             obj = unicode(obj, encoding)
     return obj
 
-class SearchList(object):
+def lru_cache(maxsize=1024):
+    """Memoize a function of hashable positional arguments.
+
+    The results of the maxsize most recently used arguments are kept
+    (functools.lru_cache only exists in Python 3).
+    """
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            with lock:
+                if args in cache:
+                    ## move to the most recently used end
+                    value = cache[args] = cache.pop(args)
+                    return value
+            value = func(*args)
+            with lock:
+                cache[args] = value
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def decode_html(page_html):
+    """Return page_html as unicode, using its declared charset if any.
+
+    lxml assumes latin-1 for undeclared byte strings, so RNC pages are
+    decoded here before parsing (utf-8, falling back to windows-1251).
+    """
+    if isinstance(page_html, unicode):
+        return page_html
+    declared = re.search(r'charset=["\']?([\w-]+)', page_html[:2048], re.I)
+    encodings = ['utf-8', 'windows-1251']
+    if declared:
+        encodings.insert(0, declared.group(1))
+    for encoding in encodings:
+        try:
+            return page_html.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            pass
+    return page_html.decode('utf-8', 'replace')
+
+def _node_contents(element):
+    """Return the child nodes (text and elements) of an lxml element.
+
+    This is the lxml equivalent of BeautifulSoup's Tag.contents.
+    """
+    contents = []
+    if element.text:
+        contents.append(element.text)
+    for child in element:
+        contents.append(child)
+        if child.tail:
+            contents.append(child.tail)
+    return contents
+
+def _node_string(node):
+    """Return the lxml equivalent of BeautifulSoup's .string for a node."""
+    while not isinstance(node, basestring):
+        if not isinstance(node.tag, basestring):
+            ## comments and processing instructions
+            return node.text
+        contents = _node_contents(node)
+        if len(contents) != 1:
+            return None
+        node = contents[0]
+    return to_unicode_or_bust(node)
+
+def _parse_totals_tree(tree):
+    """Return the documents and contexts totals from an lxml tree."""
+    documents = tree.xpath('/html/body/div[3]/p[4]/span[1]/text()')
+    contexts = tree.xpath('/html/body/div[3]/p[4]/span[3]/text()')
+
+    try:
+        d = int(documents[0].replace(' ', ''))
+    except IndexError:
+        d = 0
+
+    try:
+        c = int(contexts[0].replace(' ', ''))
+    except IndexError:
+        c = 0
+
+    return d, c
+
+class ResultsPage(object):
+    """Everything thrunc reads from one RNC results page, from one parse."""
+
+    def __init__(self, page_html):
+        """Parse page_html once with lxml and extract its contents.
+
+        Attributes
+        ----------
+          documents (int): total number of documents found by the query
+          contexts (int): total number of contexts found by the query
+          has_results (bool): True if the page lists any <li> entries
+          listed (int): number of <li> entries (documents) on the page
+          sources (list): (source_name, examples) tuples, one for each <li>
+            with an "Все"/"All" examples link
+          hits (list): for each of sources, the highlighted words (the hits
+            of the query) in the examples shown for it
+        """
+        tree = html.fromstring(decode_html(page_html))
+        self.documents, self.contexts = _parse_totals_tree(tree)
+        self.sources = []
+        self.hits = []
+
+        ol = tree.find('.//ol')
+        lis = ol.findall('.//li') if ol is not None else []
+        self.has_results = bool(lis)
+        self.listed = len(lis)
+        for li in lis:
+            contents = _node_contents(li)
+            if len(contents) < 5:
+                continue
+            label = _node_string(contents[4])
+            if label is None:
+                continue
+            if label.startswith(u"Все") or label.startswith(u"All"):
+                examples = re.search(ur'(\d+)', label)
+                if examples:
+                    source_examples = int(examples.group(0))
+                else:
+                    source_examples = 0
+                self.sources.append((_node_string(contents[0]),
+                                     source_examples))
+                self.hits.append([hit.text_content() for hit in li.xpath(
+                    './/*[contains(concat(" ", @class, " "), " g-em ")]')])
+
+def expand_tokens(results):
+    """Yield each result dict (see SearchList.iter_results) once per token.
+
+    The yielded dicts have tokens=1, as in the old one-element-per-token
+    search lists. Each one is a new dict, so it may be changed freely.
+    """
+    for result in results:
+        token = dict(result)
+        token[u"tokens"] = 1
+        for i in range(result[u"tokens"]):
+            yield dict(token)
+
+def write_xml_atomically(root, file_name):
+    """Write the tree under root to file_name.
+
+    The XML is written to a temporary file which then replaces the old
+    one, so a crash mid-write never leaves a truncated file.
+    """
+    tree = ET.ElementTree(root)
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, tmp_name = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            tree.write(stream, encoding='utf-8', xml_declaration=True)
+            stream.flush()
+            os.fsync(stream.fileno())
+        ## mkstemp() files are private; keep the permissions of the
+        ## file being replaced instead
+        if os.path.exists(file_name):
+            mode = stat.S_IMODE(os.stat(file_name).st_mode)
+            if os.name == "nt":
+                os.remove(file_name)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp_name, mode)
+        os.rename(tmp_name, file_name)
+    except:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+class XMLSearchListBase(object):
+    """Running the queries of an XML search list and reading their results.
+
+    Subclasses provide pending_queries(), checkpoint() and write():
+    SearchList, which holds the whole tree and can add searches to it, and
+    StreamingSearchList, which only holds one <derivedVerb> at a time.
+    """
+
+    def search_modern(self, bv, dv, gramm_cat="praet", end_year=1899,
+                      fetcher=None):
+        """Search the modern subcorpus for the contents of a <derivedVerb>.
+
+        Parameters
+        ----------
+          bv (ET.Element): a base verb element (parent of dv)
+          dv (ET.Element): a derived verb element (child of bv)
+          gramm_cat (str): grammatical category to search for
+          end_year (int): limit searches to sources created prior to this year
+          fetcher (ConcurrentFetcher): fetch the results pages concurrently
+        """
+
+        qu = dv.find(u'query')
+        if qu is None:
+            qu = ET.SubElement(dv, u'query')
+
+        if qu.get(u'successful') == u'no':
+
+            rs = qu.find(u'results')
+            if rs is None:
+                rs = ET.SubElement(qu, u'results')
+
+            base_verb = bv.get(u'simplex')
+            pfx_status = dv.get(u'prefixed', u'no')
+            sfx_status = dv.get(u'suffixed', u'no')
+            ## get prefix information
+            pfxe = dv.find(u'prefix')
+            pfx_name = pfxe.get(u'prefixName')
+            ## get suffix information (add_search_to_list doesn't make one)
+            sfxe = dv.find(u'suffix')
+            if sfxe is not None:
+                sfx = sfxe.text
+            else:
+                sfx = None
+            ## get full verb information
+            fve = dv.find(u'fullVerb')
+            full_verb = fve.text
+
+            search = modern_search(base_verb=base_verb, full_verb=full_verb,
+                                   pfx_status=pfx_status, pfx_name=pfx_name,
+                                   sfx_status=sfx_status, sfx=sfx,
+                                   gramm_cat=gramm_cat, end_year=end_year)
+            search.scrape_pages(fetcher=fetcher)
+
+            rs.set(u"expectedDocuments", u"{}".format(search.documents))
+            rs.set(u"expectedContexts", u"{}".format(search.contexts))
+
+            ## one <result> per source and page; see iter_tokens()
+            for d in search.all_search_results:
+                re = ET.SubElement(rs, u'result')
+                re.set(u'pageIndex', u"{}".format(d[14]))
+                re.set(u'tokens', u"{}".format(d[13]))
+                sn = ET.SubElement(re, u'sourceName')
+                sn.text = u"{}".format(d[9])
+                sn.set(u'begDate', u"{}".format(d[10]))
+                sn.set(u'centerDate', u"{}".format(d[11]))
+                sn.set(u'endDate', u"{}".format(d[12]))
+            q = dv.find(u'query')
+            q.set(u'successful', u'yes')
+            ## its checkpoint is dropped once the file is written
+            self.unsaved_searches.append(search)
+            self.mark_changed()
+
+    def iter_results(self, dv):
+        """Yield one dict per <result> of a <derivedVerb>.
+
+        Each dict has the keys pageIndex, sourceName, begDate, centerDate,
+        endDate and tokens. Results written before tokens were recorded
+        stand for a single token each.
+        """
+        for re in dv.findall(u'query/results/result'):
+            sn = re.find(u'sourceName')
+            yield {
+                u"pageIndex": int(re.get(u'pageIndex')),
+                u"sourceName": sn.text,
+                u"begDate": float(sn.get(u'begDate')),
+                u"centerDate": float(sn.get(u'centerDate')),
+                u"endDate": float(sn.get(u'endDate')),
+                u"tokens": int(re.get(u'tokens', 1)),
+                }
+
+    def iter_tokens(self, dv):
+        """Yield the results of a <derivedVerb> once per token."""
+        return expand_tokens(self.iter_results(dv))
+
+    def mark_changed(self, n=1):
+        """Record n changes to the tree and checkpoint if one is due."""
+        self.unsaved_changes += n
+        self.checkpoint()
+
+    def _discard_checkpoints(self):
+        """Forget the checkpointed pages of searches saved to the file."""
+        for search in self.unsaved_searches:
+            search.discard_checkpoint()
+        self.unsaved_searches = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.unsaved_changes:
+            self.write()
+        return False
+
+class SearchList(XMLSearchListBase):
     """An XML document containing a list of search terms."""
 
-    def __init__(self, file_name):
+    def __init__(self, file_name, checkpoint_every=50,
+                 checkpoint_interval=60.0):
         """Initialize XML file object.
 
         Parameters
         ----------
           file_name (str): name of the XML file. It will be created if it
             does not already exist.
+          checkpoint_every (int): write the file after this many changes
+          checkpoint_interval (float): write the file if it has unsaved
+            changes and this many seconds have passed since the last write
+
+        A SearchList is meant to live for a whole session: changes are
+        saved in batches by checkpoint(), and in full by write() or on
+        leaving a `with SearchList(...) as sl:` block.
         """
         self.exists = False
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.unsaved_changes = 0
+        self.unsaved_searches = []
+        self.last_write = time.time()
         if file_name.endswith(".xml"):
             self.file_name = file_name
         else:
@@ -84,20 +545,22 @@ class SearchList(object):
         try:
             self.tree = ET.parse(self.file_name, parser=self.unicode_parser)
             self.root = self.tree.getroot()
-            print "Search XML file already exists."
+            log.info(u"Search XML file already exists.")
             self.exists = True
         except IOError as e:
-            print "IOError: {}".format(e)
+            log.info(u"Search XML file didn't exist, so I made one (%s).",
+                     e)
             self.root = ET.Element("searchList")
-            print "Search XML file didn't exist, so I made one."
             self.exists = False
+        self._build_indexes()
 
-    def add_results(self, url):
+    def add_results(self, url, session=None):
         """Return the number documents and contexts from an RNC search.
 
         Parameters
         ----------
           url (str): url for the first page of RNC results (...&p=0)
+          session (HTTPSession): connection pool to use (default: SESSION)
 
         Returns
         -------
@@ -110,24 +573,10 @@ class SearchList(object):
           'Found 316 documents, 434 contexts.'
           d, c = (316, 434)
         """
-        p = Webpage(address=url)
-
-        tree = html.fromstring(p.html)
-
-        documents = tree.xpath('/html/body/div[3]/p[4]/span[1]/text()')
-        contexts = tree.xpath('/html/body/div[3]/p[4]/span[3]/text()')
-
-        try:
-            d = int(documents[0].replace(' ', ''))
-        except IndexError:
-            d = 0
-
-        try:
-            c = int(contexts[0].replace(' ', ''))
-        except IndexError:
-            c = 0
+        p = Webpage(address=url, session=session)
+        d, c = p.results.documents, p.results.contexts
 
-        print u"Found {} documents, {} contexts.".format(d, c)
+        log.info(u"Found %s documents, %s contexts.", d, c)
         return d, c
 
     def add_search_to_list(self, base_verb=u"", derived_verb=u"",
@@ -177,366 +626,2216 @@ class SearchList(object):
         date_created = to_unicode_or_bust(time.strftime("%Y-%m-%d"))
         time_created = to_unicode_or_bust(time.strftime("%H:%M:%S %Z"))
 
+        if self._add_search(base_verb=base_verb, derived_verb=derived_verb,
+                            dv_pfx=dv_pfx, dv_pfx_name=dv_pfx_name,
+                            dv_sec=dv_sec, dv_rfx=dv_rfx,
+                            date_created=date_created,
+                            time_created=time_created):
+            self.mark_changed()
+
+    def add_searches(self, searches):
+        """Add many search queries at once.
+
+        Parameters
+        ----------
+          searches (iterable): dicts of keyword arguments for
+            add_search_to_list(), e.g. {'derived_verb': u'прочитать',
+            'dv_pfx': u'про', 'dv_pfx_name': u'pro-'}
+
+        Returns
+        -------
+          n (int): number of <derivedVerb> elements created
+        """
+        date_created = to_unicode_or_bust(time.strftime("%Y-%m-%d"))
+        time_created = to_unicode_or_bust(time.strftime("%H:%M:%S %Z"))
+
+        n = 0
+        for search in searches:
+            if self._add_search(date_created=date_created,
+                                time_created=time_created, **search):
+                n += 1
+                self.mark_changed()
+        return n
+
+    def _build_indexes(self):
+        """Index the <baseVerb>, <derivedVerbCluster> and <derivedVerb>
+        elements of the tree, so that add_search_to_list() never scans it.
+        """
+        self.base_verbs = {}     # simplex -> baseVerb
+        self.clusters = {}       # (simplex, pfxForm) -> derivedVerbCluster
+        self.derived_verbs = {}  # (simplex, pfxForm, fullVerb) -> derivedVerb
+        self.child_counts = {}   # simplex or (simplex, pfxForm) -> children
+
+        self.child_counts[None] = len(self.root.findall(u'baseVerb'))
+        for bv in self.root.findall(u'baseVerb'):
+            simplex = bv.get(u'simplex')
+            self.base_verbs.setdefault(simplex, bv)
+            dvcs = bv.findall(u'derivedVerbCluster')
+            self.child_counts[simplex] = (self.child_counts.get(simplex, 0)
+                                          + len(dvcs))
+            for dvc in dvcs:
+                pfx_form = dvc.get(u'pfxForm')
+                if pfx_form is None:
+                    continue
+                self.clusters.setdefault((simplex, pfx_form), dvc)
+                dvs = dvc.findall(u'derivedVerb')
+                key = (simplex, pfx_form)
+                self.child_counts[key] = (self.child_counts.get(key, 0)
+                                          + len(dvs))
+                for dv in dvs:
+                    for fdv in dv.findall(u'fullVerb'):
+                        if fdv.text is not None:
+                            self.derived_verbs.setdefault(
+                                (simplex, pfx_form, fdv.text), dv)
+
+    def _add_search(self, base_verb=u"", derived_verb=u"", dv_pfx=u"",
+                    dv_pfx_name=u"", dv_sec=False, dv_rfx=False,
+                    date_created=u"", time_created=u""):
+        """Add one search query to the tree, using the indexes.
+
+        Returns
+        -------
+          True if a new <derivedVerb> element was created, False otherwise
+        """
         if derived_verb.endswith(u"ся") or derived_verb.endswith(u"сь"):
             dv_rfx=True
 
-        bv_exists = False ## assume base verb doesn't have an entry yet
-        lb = len(self.root.findall(u'baseVerb'))
-        for verb in self.root.findall(u'baseVerb'):
-            if verb.get(u'simplex') == base_verb:
-                bv = verb ## found an entry for base verb
-                bv_exists = True
-
-        if bv_exists == False: ## no entry for base verb, so make one
+        bv = self.base_verbs.get(base_verb)
+        if bv is None: ## no entry for base verb, so make one
+            self.child_counts[None] += 1
             bv = ET.SubElement(self.root, u"baseVerb")
-            bv.set(u"idx", u"{}".format(lb + 1))
+            bv.set(u"idx", u"{}".format(self.child_counts[None]))
             bv.set(u"simplex", u"{}".format(base_verb))
             bv.set(u"dateCreated", u"{}".format(date_created))
             bv.set(u"timeCreated", u"{}".format(time_created))
-            bv_exists = True
-
-        if bv_exists == True: ## now look for the derived verb cluster
-            ## created dvc with idx, dateCreated, timeCreated, pfxForm
-            dvc_exists = False ## assume that derivedVerbCluster doesn't exist
-            ldc = len(bv.findall(u'derivedVerbCluster'))
-            for dvcluster in bv.findall(u'derivedVerbCluster'):
-                if dvcluster.get(u'pfxForm') is not None:
-                    if dvcluster.get(u'pfxForm') == dv_pfx:
-                        dvc_exists = True
-
-            if dvc_exists == False:
-                dvc = ET.SubElement(bv, u'derivedVerbCluster')
-                dvc.set(u'idx', u'{}'.format(ldc + 1))
-                dvc.set(u'dateCreated', u'{}'.format(date_created))
-                dvc.set(u'timeCreated', u'{}'.format(time_created))
-                dvc.set(u'pfxForm', u'{}'.format(dv_pfx))
-                dvc_exists = True
-
-            if dvc_exists == True:
-
-                dv_exists = False
-                ld = len(dvc.findall(u'derivedVerb'))
-                for dverb in dvc.findall(u'derivedVerb'):
-                    for fdv in dverb.findall(u'fullVerb'):
-                        if fdv.text is not None:
-                            if fdv.text == derived_verb:
-                                dv_exists = True
-
-                if dv_exists == False:
-                    dv = ET.SubElement(dvc, u"derivedVerb")
-                    dv.set(u"idx", u"{}".format(ld + 1))
-                    dv.set(u"dateCreated", u"{}".format(date_created))
-                    dv.set(u"timeCreated", u"{}".format(time_created))
-
-                    if dv_pfx == u"":
-                        dv.set(u"prefixed", u"no")
-                        dvp = ET.SubElement(dv, u"prefix")
-                        dvp.set(u"prefixName", u"")
-                    else:
-                        dv.set(u"prefixed", u"yes")
-                        dvp = ET.SubElement(dv, u"prefix")
-                        dvp.set(u"prefixName", u"{}".format(dv_pfx_name))
-                        dvp.text = dv_pfx
+            self.base_verbs[base_verb] = bv
+
+        ## now look for the derived verb cluster
+        dvc = self.clusters.get((base_verb, dv_pfx))
+        if dvc is None:
+            ldc = self.child_counts.get(base_verb, 0) + 1
+            self.child_counts[base_verb] = ldc
+            dvc = ET.SubElement(bv, u'derivedVerbCluster')
+            dvc.set(u'idx', u'{}'.format(ldc))
+            dvc.set(u'dateCreated', u'{}'.format(date_created))
+            dvc.set(u'timeCreated', u'{}'.format(time_created))
+            dvc.set(u'pfxForm', u'{}'.format(dv_pfx))
+            self.clusters[(base_verb, dv_pfx)] = dvc
+
+        if (base_verb, dv_pfx, derived_verb) in self.derived_verbs:
+            return False
+
+        ld = self.child_counts.get((base_verb, dv_pfx), 0) + 1
+        self.child_counts[(base_verb, dv_pfx)] = ld
+        dv = ET.SubElement(dvc, u"derivedVerb")
+        dv.set(u"idx", u"{}".format(ld))
+        dv.set(u"dateCreated", u"{}".format(date_created))
+        dv.set(u"timeCreated", u"{}".format(time_created))
+
+        if dv_pfx == u"":
+            dv.set(u"prefixed", u"no")
+            dvp = ET.SubElement(dv, u"prefix")
+            dvp.set(u"prefixName", u"")
+        else:
+            dv.set(u"prefixed", u"yes")
+            dvp = ET.SubElement(dv, u"prefix")
+            dvp.set(u"prefixName", u"{}".format(dv_pfx_name))
+            dvp.text = dv_pfx
 
-                    if dv_rfx == True:
-                        dv.set(u"reflexive", u"yes")
-                    else:
-                        dv.set(u"reflexive", u"no")
+        if dv_rfx == True:
+            dv.set(u"reflexive", u"yes")
+        else:
+            dv.set(u"reflexive", u"no")
 
-                    if dv_sec == True:
-                        dv.set(u"secondary", u"yes")
-                    else:
-                        dv.set(u"secondary", u"no")
+        if dv_sec == True:
+            dv.set(u"secondary", u"yes")
+        else:
+            dv.set(u"secondary", u"no")
 
-                    dvf = ET.SubElement(dv, u"fullVerb")
-                    dvf.text = derived_verb
+        dvf = ET.SubElement(dv, u"fullVerb")
+        dvf.text = derived_verb
 
-                    ## create <query> element
-                    qe = ET.SubElement(dv, u"query")
-                    qe.set(u"subcorpus", u'modern')
-                    qe.set(u"successful", u"no")
-                    qe.set(u"dateCreated", u"{}".format(date_created))
-                    qe.set(u"timeCreated", u"{}".format(time_created))
+        ## create <query> element
+        qe = ET.SubElement(dv, u"query")
+        qe.set(u"subcorpus", u'modern')
+        qe.set(u"successful", u"no")
+        qe.set(u"dateCreated", u"{}".format(date_created))
+        qe.set(u"timeCreated", u"{}".format(time_created))
 
-    def search_modern(self, bv, dv, gramm_cat="praet", end_year=1899):
-        """Search the modern subcorpus for the contents of a <derivedVerb>.
+        self.derived_verbs[(base_verb, dv_pfx, derived_verb)] = dv
+        return True
+
+    def pending_queries(self):
+        """Yield (bv, dv) for every <derivedVerb> with an unsuccessful query.
+
+        Derived verbs are looked for inside <derivedVerbCluster> elements
+        and, for older files, directly under <baseVerb>.
+        """
+        for bv in self.root.findall(u'baseVerb'):
+            dvs = (bv.findall(u'derivedVerbCluster/derivedVerb')
+                   + bv.findall(u'derivedVerb'))
+            for dv in dvs:
+                qu = dv.find(u'query')
+                if qu is not None and qu.get(u'successful') == u'no':
+                    yield bv, dv
+
+    def check(self):
+        """Print XML to console."""
+        ## write straight to stdout rather than building one huge string
+        ET.ElementTree(self.root).write(sys.stdout, encoding='utf-8',
+                                        xml_declaration=True)
+        print
+
+    def write(self):
+        """Save XML to disk (atomically, see write_xml_atomically)."""
+        write_xml_atomically(self.root, self.file_name)
+        log.debug(u"Saved %d changes to %s", self.unsaved_changes,
+                  self.file_name)
+        self._discard_checkpoints()
+        self.unsaved_changes = 0
+        self.last_write = time.time()
+
+    def checkpoint(self):
+        """Write the file if enough changes or time have accumulated.
+
+        Returns
+        -------
+          True if the file was written, False otherwise
+        """
+        if self.unsaved_changes == 0:
+            return False
+        if (self.unsaved_changes >= self.checkpoint_every
+                or time.time() - self.last_write >= self.checkpoint_interval):
+            self.write()
+            return True
+        return False
+
+    def run(self):
+        """Run all possible searches of <derivedVerb> elements."""
+        pass
+
+class StreamingSearchList(XMLSearchListBase):
+    """A SearchList that is read and rewritten one <derivedVerb> at a time.
+
+    pending_queries() walks the file with iterparse and yields pending
+    queries lazily. Every <derivedVerb> is written to a temporary copy of
+    the file as soon as the caller is done with it (i.e. after its
+    results have been added) and is then dropped from memory, so memory
+    use doesn't grow with the size of the list. write() copies whatever
+    is left and replaces the original file.
+
+    Adding new searches requires the whole tree, so it has no
+    add_search_to_list(): use SearchList for that.
+    """
+
+    containers = (u"searchList", u"baseVerb", u"derivedVerbCluster")
+
+    def __init__(self, file_name, out_name=None):
+        """Prepare to stream file_name (nothing is read yet).
 
         Parameters
         ----------
-          bv (ET.Element): a base verb element (parent of dv)
-          dv (ET.Element): a derived verb element (child of bv)
-          gramm_cat (str): grammatical category to search for
-          end_year (int): limit searches to sources created prior to this year
+          file_name (str): name of an existing XML search list
+          out_name (str): where to write the updated list (default: replace
+            file_name)
         """
+        if file_name.endswith(".xml"):
+            self.file_name = file_name
+        else:
+            self.file_name = file_name + ".xml"
+        self.out_name = out_name or self.file_name
+        self.exists = os.path.exists(self.file_name)
+        self.unsaved_changes = 0
+        self.unsaved_searches = []
+        self.stream = None
+        self.tmp_name = None
+        self.skip_searches = False
+        self.walker = None
+
+    def _start_tag(self, elem):
+        """Return the serialized start tag of a container element."""
+        attrs = u"".join(u" {}={}".format(k, quoteattr(v))
+                         for k, v in sorted(elem.items()))
+        return u"<{}{}>".format(elem.tag, attrs).encode('utf-8')
+
+    def pending_queries(self):
+        """Yield (bv, dv) for every <derivedVerb> with an unsuccessful query.
+
+        Each dv is written out and freed when the caller asks for the next
+        one, so it must be finished with (e.g. by search_modern) by then.
+        """
+        if self.walker is not None:
+            raise RuntimeError("pending_queries() can only be walked once")
+        self.walker = self._walk()
+        return self.walker
+
+    def _walk(self):
+        directory = os.path.dirname(os.path.abspath(self.out_name))
+        fd, self.tmp_name = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        self.stream = os.fdopen(fd, "wb")
+        self.stream.write("<?xml version='1.0' encoding='utf-8'?>\n")
+
+        stack = []
+        bv = None
+        for event, elem in ET.iterparse(self.file_name,
+                                        events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                if elem.tag in self.containers:
+                    self.stream.write(self._start_tag(elem))
+                if elem.tag == u"baseVerb":
+                    bv = elem
+                continue
+
+            stack.pop()
+            if elem.tag in self.containers:
+                self.stream.write(u"</{}>".format(elem.tag).encode('utf-8'))
+                elem.clear()
+                continue
+            if not stack or stack[-1].tag not in self.containers:
+                ## part of a unit that will be written as a whole
+                continue
+
+            if elem.tag == u"derivedVerb" and not self.skip_searches:
+                qu = elem.find(u'query')
+                if qu is not None and qu.get(u'successful') == u'no':
+                    yield bv, elem
+            elem.tail = None
+            ET.ElementTree(elem).write(self.stream, encoding='utf-8',
+                                       xml_declaration=False)
+            stack[-1].remove(elem)
+
+        self.stream.close()
+        self.stream = None
+
+    def checkpoint(self):
+        """Flush finished elements to the temporary file."""
+        if self.stream is not None:
+            self.stream.flush()
+        return False
 
-        qu = dv.find(u'query')
-        if qu is None:
-            qu = ET.SubElement(dv, u'query')
+    def write(self):
+        """Copy the rest of the file unchanged and replace the original."""
+        if self.walker is None:
+            self.pending_queries()
+        self.skip_searches = True
+        for pair in self.walker:
+            pass
+        if self.tmp_name is None:
+            return
+        if os.path.exists(self.out_name):
+            mode = stat.S_IMODE(os.stat(self.out_name).st_mode)
+            if os.name == "nt":
+                os.remove(self.out_name)
+        else:
+            mode = stat.S_IMODE(os.stat(self.file_name).st_mode)
+        os.chmod(self.tmp_name, mode)
+        os.rename(self.tmp_name, self.out_name)
+        self.tmp_name = None
+        self._discard_checkpoints()
+        self.unsaved_changes = 0
 
-        if qu.get(u'successful') == u'no':
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.write()
+        return False
 
-            rs = qu.find(u'results')
-            if rs is None:
-                rs = ET.SubElement(qu, u'results')
+    def check(self):
+        """Print the XML file to console without loading it."""
+        with open(self.file_name, "rb") as stream:
+            for chunk in iter(lambda: stream.read(65536), ""):
+                sys.stdout.write(chunk)
+        print
+
+class SQLiteSearchList(object):
+    """A search list stored in SQLite tables instead of an XML document.
+
+    It has the same API as SearchList (add_search_to_list, add_searches,
+    pending_queries, search_modern, checkpoint, write), but only the rows
+    being worked on are held in memory, and pending queries are found
+    through an index instead of a scan of the whole list.
+    """
+
+    schema = [
+        u"CREATE TABLE IF NOT EXISTS baseVerbs (id INTEGER PRIMARY KEY, "
+        u"simplex TEXT UNIQUE, dateCreated TEXT, timeCreated TEXT)",
+        u"CREATE TABLE IF NOT EXISTS clusters (id INTEGER PRIMARY KEY, "
+        u"baseVerb INT REFERENCES baseVerbs (id), idx INT, pfxForm TEXT, "
+        u"dateCreated TEXT, timeCreated TEXT, UNIQUE (baseVerb, pfxForm))",
+        u"CREATE TABLE IF NOT EXISTS derivedVerbs (id INTEGER PRIMARY KEY, "
+        u"cluster INT REFERENCES clusters (id), idx INT, fullVerb TEXT, "
+        u"prefix TEXT, prefixName TEXT, suffix TEXT, suffixName TEXT, "
+        u"prefixed TEXT, suffixed TEXT, secondary TEXT, reflexive TEXT, "
+        u"dateCreated TEXT, timeCreated TEXT, UNIQUE (cluster, fullVerb))",
+        u"CREATE TABLE IF NOT EXISTS queries (id INTEGER PRIMARY KEY, "
+        u"derivedVerb INT REFERENCES derivedVerbs (id), subcorpus TEXT, "
+        u"successful TEXT, expectedDocuments INT, expectedContexts INT, "
+        u"dateCreated TEXT, timeCreated TEXT, priority INT DEFAULT 0, "
+        u"attempts INT DEFAULT 0, leaseOwner TEXT, leaseUntil REAL)",
+        u"CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY, "
+        u"query INT REFERENCES queries (id), pageIndex INT, "
+        u"sourceName TEXT, begDate REAL, centerDate REAL, endDate REAL, "
+        u"tokens INT DEFAULT 1)",
+        u"CREATE INDEX IF NOT EXISTS queries_successful "
+        u"ON queries (successful, derivedVerb)",
+        u"CREATE INDEX IF NOT EXISTS queries_queue "
+        u"ON queries (successful, priority, id)",
+        u"CREATE INDEX IF NOT EXISTS derivedVerbs_prefix "
+        u"ON derivedVerbs (prefix)",
+        u"CREATE INDEX IF NOT EXISTS clusters_pfxForm ON clusters (pfxForm)",
+        u"CREATE INDEX IF NOT EXISTS results_query ON results (query)",
+        ]
 
-            base_verb = bv.get(u'simplex')
-            pfx_status = dv.get(u'prefixed')
-            sfx_status = dv.get(u'suffixed')
-            ## get prefix information
-            pfxe = dv.find(u'prefix')
-            pfx_name = pfxe.get(u'prefixName')
-            pfx = pfxe.text
-            ## get suffix information
-            sfxe = dv.find(u'suffix')
-            sfx_name = sfxe.get(u'suffixName')
-            sfx = sfxe.text
-            ## get full verb information
-            fve = dv.find(u'fullVerb')
-            full_verb = fve.text
+    ## columns added since the first version of the schema
+    added_columns = [
+        (u"results", u"tokens", u"INT DEFAULT 1"),
+        (u"queries", u"priority", u"INT DEFAULT 0"),
+        (u"queries", u"attempts", u"INT DEFAULT 0"),
+        (u"queries", u"leaseOwner", u"TEXT"),
+        (u"queries", u"leaseUntil", u"REAL"),
+        ]
 
-            query = RNCQueryModern(
-                lex1=full_verb.encode('utf-8'),
-                gramm1=gramm_cat.encode('utf-8'),
-                end_year=u"{}".format(end_year).encode('utf-8')
-            )
-            search = RNCSearch(
-                rnc_query=query,
-                subcorpus=u"modern".encode('utf-8'),
-                pfx_val=pfx_status.encode('utf-8'),
-                prefix=pfx_name.encode('utf-8'),
-                sfx_val=sfx_status.encode('utf-8'),
-                ## the next line raises an AttributeError if sfx is None
-                #suffix=sfx.encode('utf-8'),
-                suffix=sfx,
-                lem=full_verb.encode('utf-8'),
-                gramm_cat=gramm_cat.encode('utf-8'),
-                base_verb=base_verb.encode('utf-8')
-                )
+    def __init__(self, file_name, checkpoint_every=50,
+                 checkpoint_interval=60.0):
+        """Open (or create) the database.
+
+        Parameters
+        ----------
+          file_name (str): name of the SQLite file
+          checkpoint_every (int): commit after this many changes
+          checkpoint_interval (float): commit if there are uncommitted
+            changes and this many seconds have passed since the last commit
+        """
+        if file_name.endswith(".db"):
+            self.file_name = file_name
+        else:
+            self.file_name = file_name + ".db"
+        self.exists = os.path.exists(self.file_name)
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.unsaved_changes = 0
+        self.last_write = time.time()
+
+        self.conn = sqlite3.connect(self.file_name, timeout=60)
+        self.conn.row_factory = sqlite3.Row
+        ## WAL lets other processes read the list while a crawl writes it
+        self.conn.execute(u"PRAGMA journal_mode=WAL")
+        for table, column, declaration in self.added_columns:
+            columns = [row[1] for row in self.conn.execute(
+                u"PRAGMA table_info({})".format(table))]
+            if columns and column not in columns:
+                self.conn.execute(u"ALTER TABLE {} ADD COLUMN {} {}".format(
+                    table, column, declaration))
+        for statement in self.schema:
+            self.conn.execute(statement)
+        self.conn.commit()
 
-            search.scrape_pages()
+    def add_search_to_list(self, base_verb=u"", derived_verb=u"",
+                           dv_pfx=u"", dv_pfx_name=u"", dv_sec=False,
+                           dv_rfx=False):
+        """Add a new search query (see SearchList.add_search_to_list)."""
+        date_created = to_unicode_or_bust(time.strftime("%Y-%m-%d"))
+        time_created = to_unicode_or_bust(time.strftime("%H:%M:%S %Z"))
+        if self._add_search(base_verb=base_verb, derived_verb=derived_verb,
+                            dv_pfx=dv_pfx, dv_pfx_name=dv_pfx_name,
+                            dv_sec=dv_sec, dv_rfx=dv_rfx,
+                            date_created=date_created,
+                            time_created=time_created):
+            self.mark_changed()
 
-            rt = self.add_results(url=search.address)
-            rs.set(u"expectedDocuments", u"{}".format(rt[0]))
-            rs.set(u"expectedContexts", u"{}".format(rt[1]))
+    def add_searches(self, searches):
+        """Add many search queries at once (see SearchList.add_searches).
 
-            for d in search.all_search_results:
-                for i in range(d[13]):
-                    re = ET.SubElement(rs, u'result')
-                    re.set(u'pageIndex', u"{}".format(d[14]))
-                    sn = ET.SubElement(re, u'sourceName')
-                    sn.text = u"{}".format(d[9])
-                    sn.set(u'begDate', u"{}".format(d[10]))
-                    sn.set(u'centerDate', u"{}".format(d[11]))
-                    sn.set(u'endDate', u"{}".format(d[12]))
-            q = dv.find(u'query')
-            q.set(u'successful', u'yes')
+        Returns
+        -------
+          n (int): number of derived verbs created
+        """
+        date_created = to_unicode_or_bust(time.strftime("%Y-%m-%d"))
+        time_created = to_unicode_or_bust(time.strftime("%H:%M:%S %Z"))
+
+        n = 0
+        for search in searches:
+            if self._add_search(date_created=date_created,
+                                time_created=time_created, **search):
+                n += 1
+                self.mark_changed()
+        return n
+
+    def _get_or_create(self, select, select_args, insert, insert_args):
+        """Return the id of the row found by select, inserting it if needed.
+
+        Returns
+        -------
+          row_id, created (tup): the id, and True if the row is new
+        """
+        row = self.conn.execute(select, select_args).fetchone()
+        if row is not None:
+            return row[0], False
+        return self.conn.execute(insert, insert_args).lastrowid, True
+
+    def _add_search(self, base_verb=u"", derived_verb=u"", dv_pfx=u"",
+                    dv_pfx_name=u"", dv_sec=False, dv_rfx=False,
+                    date_created=u"", time_created=u"", suffix=None,
+                    suffix_name=None):
+        """Insert one search query.
+
+        Returns
+        -------
+          True if a new derived verb was created, False otherwise
+        """
+        if derived_verb.endswith(u"ся") or derived_verb.endswith(u"сь"):
+            dv_rfx=True
+
+        bv_id, created = self._get_or_create(
+            u"SELECT id FROM baseVerbs WHERE simplex = ?", (base_verb,),
+            u"INSERT INTO baseVerbs (simplex, dateCreated, timeCreated) "
+            u"VALUES (?, ?, ?)", (base_verb, date_created, time_created))
+
+        dvc_id, created = self._get_or_create(
+            u"SELECT id FROM clusters WHERE baseVerb = ? AND pfxForm = ?",
+            (bv_id, dv_pfx),
+            u"INSERT INTO clusters (baseVerb, idx, pfxForm, dateCreated, "
+            u"timeCreated) VALUES (?, (SELECT COUNT(*) + 1 FROM clusters "
+            u"WHERE baseVerb = ?), ?, ?, ?)",
+            (bv_id, bv_id, dv_pfx, date_created, time_created))
+
+        if dv_pfx == u"":
+            prefixed, dv_pfx_name = u"no", u""
+        else:
+            prefixed = u"yes"
+        dv_id, created = self._get_or_create(
+            u"SELECT id FROM derivedVerbs WHERE cluster = ? AND fullVerb = ?",
+            (dvc_id, derived_verb),
+            u"INSERT INTO derivedVerbs (cluster, idx, fullVerb, prefix, "
+            u"prefixName, suffix, suffixName, prefixed, suffixed, secondary, "
+            u"reflexive, dateCreated, timeCreated) VALUES (?, (SELECT "
+            u"COUNT(*) + 1 FROM derivedVerbs WHERE cluster = ?), ?, ?, ?, ?, "
+            u"?, ?, ?, ?, ?, ?, ?)",
+            (dvc_id, dvc_id, derived_verb, dv_pfx or None, dv_pfx_name,
+             suffix, suffix_name, prefixed,
+             u"yes" if suffix else u"no",
+             u"yes" if dv_sec else u"no",
+             u"yes" if dv_rfx else u"no",
+             date_created, time_created))
+        if not created:
+            return False
+
+        self.conn.execute(
+            u"INSERT INTO queries (derivedVerb, subcorpus, successful, "
+            u"dateCreated, timeCreated) VALUES (?, 'modern', 'no', ?, ?)",
+            (dv_id, date_created, time_created))
+        return True
+
+    def pending_queries(self):
+        """Yield (bv, dv) rows for every unsuccessful query.
+
+        bv has the columns of baseVerbs; dv has those of derivedVerbs plus
+        the id of the query (as 'query').
+        """
+        return self._query_rows(u"q.successful = 'no'")
+
+    def _query_rows(self, where, args=()):
+        """Yield (bv, dv) pairs (see pending_queries) for queries q matching
+        the SQL condition where.
+        """
+        rows = self.conn.execute(
+            u"SELECT q.id AS query, d.*, b.id AS bvId, b.simplex, "
+            u"b.dateCreated AS bvDateCreated, b.timeCreated AS bvTimeCreated "
+            u"FROM queries q JOIN derivedVerbs d ON q.derivedVerb = d.id "
+            u"JOIN clusters c ON d.cluster = c.id "
+            u"JOIN baseVerbs b ON c.baseVerb = b.id "
+            u"WHERE {} ORDER BY q.id".format(where), args).fetchall()
+        for row in rows:
+            yield {u"id": row["bvId"], u"simplex": row["simplex"]}, row
+
+    def set_priority(self, priority, prefix=None):
+        """Set the priority of pending queries (higher runs first).
+
+        Parameters
+        ----------
+          priority (int): the new priority
+          prefix (unicode): only change queries of verbs with this prefix
+            form (e.g. u'пере'); None changes every pending query
+        """
+        sql = u"UPDATE queries SET priority = ? WHERE successful = 'no'"
+        args = [priority]
+        if prefix is not None:
+            sql += (u" AND derivedVerb IN (SELECT id FROM derivedVerbs "
+                    u"WHERE prefix = ?)")
+            args.append(prefix)
+        with self.conn:
+            self.conn.execute(sql, args)
+
+    def claim_query(self, owner, lease_seconds=600.0, max_attempts=5):
+        """Lease the next pending query to owner.
+
+        The highest-priority query that is not leased (or whose lease has
+        run out, e.g. because its worker crashed) and has been tried fewer
+        than max_attempts times is leased for lease_seconds. Queries whose
+        last allowed lease has run out are marked successful="failed".
+
+        Returns
+        -------
+          (bv, dv) pair as from pending_queries(), or None if none is free
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                u"UPDATE queries SET successful = 'failed', leaseOwner = "
+                u"NULL, leaseUntil = NULL WHERE successful = 'no' AND "
+                u"attempts >= ? AND leaseUntil < ?", (max_attempts, now))
+            cursor = self.conn.execute(
+                u"UPDATE queries SET leaseOwner = ?, leaseUntil = ?, "
+                u"attempts = attempts + 1 WHERE id = (SELECT id FROM queries "
+                u"WHERE successful = 'no' AND attempts < ? AND "
+                u"(leaseUntil IS NULL OR leaseUntil < ?) "
+                u"ORDER BY priority DESC, id LIMIT 1)",
+                (owner, now + lease_seconds, max_attempts, now))
+        if cursor.rowcount == 0:
+            return None
+        for pair in self._query_rows(u"q.leaseOwner = ? AND "
+                                     u"q.successful = 'no'", (owner,)):
+            return pair
+        return None
+
+    def renew_lease(self, query_id, owner, lease_seconds=600.0):
+        """Extend owner's lease on a query by lease_seconds from now.
+
+        Returns
+        -------
+          True if owner still holds the lease, False if it was lost
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                u"UPDATE queries SET leaseUntil = ? WHERE id = ? AND "
+                u"leaseOwner = ? AND successful = 'no'",
+                (time.time() + lease_seconds, query_id, owner))
+        return cursor.rowcount > 0
+
+    def release_query(self, query_id, owner, max_attempts=5):
+        """Give up owner's lease on a query that failed.
+
+        The query goes back in the queue, or is marked successful="failed"
+        once it has been tried max_attempts times.
+        """
+        with self.conn:
+            self.conn.execute(
+                u"UPDATE queries SET leaseOwner = NULL, leaseUntil = NULL, "
+                u"successful = CASE WHEN attempts >= ? THEN 'failed' "
+                u"ELSE successful END WHERE id = ? AND leaseOwner = ?",
+                (max_attempts, query_id, owner))
+
+    def queue_depth(self):
+        """Return the number of queries that still have to run."""
+        return self.conn.execute(u"SELECT COUNT(*) FROM queries "
+                                 u"WHERE successful = 'no'").fetchone()[0]
+
+    def search_modern(self, bv, dv, gramm_cat="praet", end_year=1899,
+                      fetcher=None):
+        """Search the modern subcorpus for one pending query.
+
+        Parameters
+        ----------
+          bv, dv (sqlite3.Row): a pair yielded by pending_queries()
+          gramm_cat (str): grammatical category to search for
+          end_year (int): limit searches to sources created prior to this year
+          fetcher (ConcurrentFetcher): fetch the results pages concurrently
+        """
+        search = modern_search(base_verb=bv["simplex"],
+                               full_verb=dv["fullVerb"],
+                               pfx_status=dv["prefixed"],
+                               pfx_name=dv["prefixName"],
+                               sfx_status=dv["suffixed"], sfx=dv["suffix"],
+                               gramm_cat=gramm_cat, end_year=end_year)
+        search.scrape_pages(fetcher=fetcher)
+        self.store_results(dv["query"], search)
+        search.discard_checkpoint()
+
+    def store_results(self, query_id, search, owner=None):
+        """Save the results of a scraped RNCSearch and mark it successful.
+
+        Results and status are written in one transaction, and only if the
+        query is still pending (and, if owner is given, still leased to
+        owner), so each query's results are stored exactly once.
+
+        Returns
+        -------
+          True if the results were stored, False otherwise
+        """
+        sql = (u"UPDATE queries SET expectedDocuments = ?, "
+               u"expectedContexts = ?, successful = 'yes', leaseOwner = NULL, "
+               u"leaseUntil = NULL WHERE id = ? AND successful = 'no'")
+        args = [search.documents, search.contexts, query_id]
+        if owner is not None:
+            sql += u" AND leaseOwner = ?"
+            args.append(owner)
+        with self.conn:
+            if self.conn.execute(sql, args).rowcount == 0:
+                return False
+            self.conn.executemany(
+                u"INSERT INTO results (query, pageIndex, sourceName, "
+                u"begDate, centerDate, endDate, tokens) "
+                u"VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((query_id, d[14], u"{}".format(d[9]), d[10], d[11], d[12],
+                  d[13]) for d in search.all_search_results))
+        self.unsaved_changes = 0
+        self.last_write = time.time()
+        return True
+
+    def iter_results(self, dv):
+        """Yield one dict per result row of a query.
+
+        dv is a row from pending_queries() or the id of a query; the keys
+        of the dicts are those of SearchList.iter_results().
+        """
+        if isinstance(dv, (int, long)):
+            query_id = dv
+        else:
+            query_id = dv["query"]
+        for r in self.conn.execute(
+                u"SELECT pageIndex, sourceName, begDate, centerDate, "
+                u"endDate, tokens FROM results WHERE query = ? ORDER BY id",
+                (query_id,)):
+            yield dict(zip(r.keys(), r))
+
+    def iter_tokens(self, dv):
+        """Yield the results of a query (see iter_results) once per token."""
+        return expand_tokens(self.iter_results(dv))
 
     def check(self):
-        """Print XML as string to console."""
-        xmlstr = ET.tostring(self.root, encoding='utf8', method='xml')
-        print xmlstr
+        """Print the number of rows in each table to console."""
+        for table in [u"baseVerbs", u"clusters", u"derivedVerbs", u"queries",
+                      u"results"]:
+            n = self.conn.execute(
+                u"SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+            print u"{}: {}".format(table, n)
+        n = self.conn.execute(u"SELECT COUNT(*) FROM queries "
+                              u"WHERE successful = 'no'").fetchone()[0]
+        print u"pending queries: {}".format(n)
 
     def write(self):
-        """Save XML to disk."""
-        tree = ET.ElementTree(self.root)
-        tree.write(self.file_name, encoding='utf-8', xml_declaration=True)
+        """Commit all changes to disk."""
+        self.conn.commit()
+        self.unsaved_changes = 0
+        self.last_write = time.time()
+
+    def mark_changed(self, n=1):
+        """Record n changes and checkpoint if one is due."""
+        self.unsaved_changes += n
+        self.checkpoint()
+
+    def checkpoint(self):
+        """Commit if enough changes or time have accumulated.
+
+        Returns
+        -------
+          True if changes were committed, False otherwise
+        """
+        if self.unsaved_changes == 0:
+            return False
+        if (self.unsaved_changes >= self.checkpoint_every
+                or time.time() - self.last_write >= self.checkpoint_interval):
+            self.write()
+            return True
+        return False
+
+    def close(self):
+        self.write()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def import_xml(self, xml_name):
+        """Copy every verb, query and result of an XML SearchList.
+
+        Queries already in the database are left as they are.
+
+        Returns
+        -------
+          n (int): number of derived verbs imported
+        """
+        sl = SearchList(file_name=xml_name)
+        n = 0
+        with self.conn:
+            for bv in sl.root.findall(u'baseVerb'):
+                dvs = [(dvc.get(u'pfxForm'), dv) for dvc in
+                       bv.findall(u'derivedVerbCluster')
+                       for dv in dvc.findall(u'derivedVerb')]
+                dvs += [(None, dv) for dv in bv.findall(u'derivedVerb')]
+                for pfx_form, dv in dvs:
+                    pfxe = dv.find(u'prefix')
+                    sfxe = dv.find(u'suffix')
+                    if pfx_form is None:
+                        pfx_form = (pfxe.text if pfxe is not None else u"")
+                    created = self._add_search(
+                        base_verb=bv.get(u'simplex'),
+                        derived_verb=dv.findtext(u'fullVerb'),
+                        dv_pfx=pfx_form or u"",
+                        dv_pfx_name=(pfxe.get(u'prefixName')
+                                     if pfxe is not None else u""),
+                        dv_sec=dv.get(u'secondary') == u"yes",
+                        dv_rfx=dv.get(u'reflexive') == u"yes",
+                        date_created=dv.get(u'dateCreated', u""),
+                        time_created=dv.get(u'timeCreated', u""),
+                        suffix=sfxe.text if sfxe is not None else None,
+                        suffix_name=(sfxe.get(u'suffixName')
+                                     if sfxe is not None else None))
+                    if not created:
+                        continue
+                    n += 1
+                    self._import_query(dv)
+        return n
+
+    def _import_query(self, dv):
+        """Copy the <query> of an XML <derivedVerb> just added by import."""
+        qu = dv.find(u'query')
+        if qu is None:
+            return
+        query_id = self.conn.execute(u"SELECT MAX(id) FROM queries")\
+            .fetchone()[0]
+        rs = qu.find(u'results')
+        expected = (None, None)
+        if rs is not None:
+            expected = (rs.get(u'expectedDocuments'),
+                        rs.get(u'expectedContexts'))
+        self.conn.execute(
+            u"UPDATE queries SET subcorpus = ?, successful = ?, "
+            u"expectedDocuments = ?, expectedContexts = ?, dateCreated = ?, "
+            u"timeCreated = ? WHERE id = ?",
+            (qu.get(u'subcorpus'), qu.get(u'successful'), expected[0],
+             expected[1], qu.get(u'dateCreated'), qu.get(u'timeCreated'),
+             query_id))
+        if rs is None:
+            return
+        rows = []
+        for re in rs.findall(u'result'):
+            sn = re.find(u'sourceName')
+            rows.append((query_id, re.get(u'pageIndex'), sn.text,
+                         sn.get(u'begDate'), sn.get(u'centerDate'),
+                         sn.get(u'endDate'), re.get(u'tokens', 1)))
+        self.conn.executemany(
+            u"INSERT INTO results (query, pageIndex, sourceName, begDate, "
+            u"centerDate, endDate, tokens) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows)
+
+    def export_xml(self, xml_name):
+        """Write the whole list to an XML file in the SearchList format."""
+        root = ET.Element(u"searchList")
+        bvs = {}
+        dvcs = {}
+        for b in self.conn.execute(u"SELECT * FROM baseVerbs ORDER BY id"):
+            bv = ET.SubElement(root, u"baseVerb")
+            bv.set(u"idx", u"{}".format(len(bvs) + 1))
+            bv.set(u"simplex", b["simplex"])
+            bv.set(u"dateCreated", b["dateCreated"] or u"")
+            bv.set(u"timeCreated", b["timeCreated"] or u"")
+            bvs[b["id"]] = bv
+        for c in self.conn.execute(u"SELECT * FROM clusters ORDER BY id"):
+            dvc = ET.SubElement(bvs[c["baseVerb"]], u"derivedVerbCluster")
+            dvc.set(u"idx", u"{}".format(c["idx"]))
+            dvc.set(u"dateCreated", c["dateCreated"] or u"")
+            dvc.set(u"timeCreated", c["timeCreated"] or u"")
+            dvc.set(u"pfxForm", c["pfxForm"])
+            dvcs[c["id"]] = dvc
+        for d in self.conn.execute(
+                u"SELECT d.*, q.id AS query, q.subcorpus, q.successful, "
+                u"q.expectedDocuments, q.expectedContexts, "
+                u"q.dateCreated AS qDateCreated, "
+                u"q.timeCreated AS qTimeCreated FROM derivedVerbs d "
+                u"JOIN queries q ON q.derivedVerb = d.id ORDER BY d.id"):
+            dv = ET.SubElement(dvcs[d["cluster"]], u"derivedVerb")
+            dv.set(u"idx", u"{}".format(d["idx"]))
+            dv.set(u"dateCreated", d["dateCreated"] or u"")
+            dv.set(u"timeCreated", d["timeCreated"] or u"")
+            dv.set(u"prefixed", d["prefixed"])
+            dvp = ET.SubElement(dv, u"prefix")
+            dvp.set(u"prefixName", d["prefixName"] or u"")
+            dvp.text = d["prefix"]
+            if d["suffix"] is not None:
+                dv.set(u"suffixed", d["suffixed"])
+                dvs = ET.SubElement(dv, u"suffix")
+                dvs.set(u"suffixName", d["suffixName"] or u"")
+                dvs.text = d["suffix"]
+            dv.set(u"reflexive", d["reflexive"])
+            dv.set(u"secondary", d["secondary"])
+            ET.SubElement(dv, u"fullVerb").text = d["fullVerb"]
+            qe = ET.SubElement(dv, u"query")
+            qe.set(u"subcorpus", d["subcorpus"])
+            qe.set(u"successful", d["successful"])
+            qe.set(u"dateCreated", d["qDateCreated"] or u"")
+            qe.set(u"timeCreated", d["qTimeCreated"] or u"")
+            if d["expectedDocuments"] is None:
+                continue
+            rs = ET.SubElement(qe, u"results")
+            rs.set(u"expectedDocuments",
+                   u"{}".format(d["expectedDocuments"]))
+            rs.set(u"expectedContexts", u"{}".format(d["expectedContexts"]))
+            for r in self.conn.execute(u"SELECT * FROM results WHERE "
+                                       u"query = ? ORDER BY id",
+                                       (d["query"],)):
+                re = ET.SubElement(rs, u"result")
+                re.set(u"pageIndex", u"{}".format(r["pageIndex"]))
+                re.set(u"tokens", u"{}".format(r["tokens"]))
+                sn = ET.SubElement(re, u"sourceName")
+                sn.text = r["sourceName"]
+                sn.set(u"begDate", u"{}".format(r["begDate"]))
+                sn.set(u"centerDate", u"{}".format(r["centerDate"]))
+                sn.set(u"endDate", u"{}".format(r["endDate"]))
+        write_xml_atomically(root, xml_name)
+
+class CrawlScheduler(object):
+    """Run the pending queries of a SQLiteSearchList on N worker threads.
+
+    The queries table is a persistent work queue: each worker leases the
+    next query by priority, scrapes it, and stores its results together
+    with the status change in one transaction. If the process dies, the
+    finished queries stay finished and unfinished leases simply run out,
+    so a new run picks up exactly where the old one stopped. A worker
+    renews its lease after every page, so only the leases of workers that
+    died or hang run out.
+    """
+
+    def __init__(self, db_name, workers=4, lease_seconds=600.0,
+                 max_attempts=5, gramm_cat="praet", end_year=1899):
+        """Initialize the scheduler.
+
+        Parameters
+        ----------
+          db_name (str): name of the SQLiteSearchList file
+          workers (int): number of threads running queries
+          lease_seconds (float): time a worker may go without scraping a
+            page of its query before other workers may take it over
+          max_attempts (int): tries before a query is marked "failed"
+          gramm_cat (str): grammatical category to search for
+          end_year (int): limit searches to sources created prior to this year
+        """
+        self.db_name = db_name
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.gramm_cat = gramm_cat
+        self.end_year = end_year
+        self.completed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def _worker(self, worker_idx):
+        """Claim and run queries until none are left."""
+        search_list = SQLiteSearchList(file_name=self.db_name)
+        try:
+            while True:
+                owner = u"{}-{}".format(worker_idx, uuid.uuid4().hex)
+                pair = search_list.claim_query(
+                    owner, lease_seconds=self.lease_seconds,
+                    max_attempts=self.max_attempts)
+                if pair is None:
+                    ## others may still release failed queries for a retry,
+                    ## and leases that run out are retried or marked failed
+                    if not search_list.conn.execute(
+                            u"SELECT COUNT(*) FROM queries WHERE "
+                            u"successful = 'no' AND (attempts < ? OR "
+                            u"leaseUntil >= ?)",
+                            (self.max_attempts, time.time())).fetchone()[0]:
+                        return
+                    time.sleep(1.0)
+                    continue
+                self._run_query(search_list, owner, *pair)
+        finally:
+            search_list.conn.close()
+
+    def _run_query(self, search_list, owner, bv, dv):
+        """Scrape one leased query and store its results."""
+        search = modern_search(base_verb=bv["simplex"],
+                               full_verb=dv["fullVerb"],
+                               pfx_status=dv["prefixed"],
+                               pfx_name=dv["prefixName"],
+                               sfx_status=dv["suffixed"], sfx=dv["suffix"],
+                               gramm_cat=self.gramm_cat,
+                               end_year=self.end_year)
+
+        def renew(page_idx):
+            if not search_list.renew_lease(dv["query"], owner,
+                                           self.lease_seconds):
+                log.warning(u"Lost the lease on query %s at page %d.",
+                            dv["query"], page_idx)
+
+        search.on_page = renew
+        try:
+            search.scrape_pages(limiter=host_bucket(search.address))
+        except Exception as e:
+            log.warning(u"Query %s failed: %s", dv["query"], e)
+            search_list.release_query(dv["query"], owner,
+                                      max_attempts=self.max_attempts)
+            with self.lock:
+                self.failed += 1
+            return
+        if search_list.store_results(dv["query"], search, owner=owner):
+            with self.lock:
+                self.completed += 1
+        PROGRESS.add(queue_depth=search_list.queue_depth())
+        search.discard_checkpoint()
 
     def run(self):
-        """Run all possible searches of <derivedVerb> elements."""
-        pass
+        """Run every pending query, returning once the queue is empty.
+
+        Returns
+        -------
+          completed, failed (tup): queries stored, and failed attempts
+        """
+        threads = [threading.Thread(target=self._worker, args=(i,))
+                   for i in range(self.workers)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            ## join() with a timeout keeps the main thread interruptible
+            while t.is_alive():
+                t.join(1.0)
+        return self.completed, self.failed
+
+## columns of a results row, as built by RNCSearch.add_row
+RESULT_HEADERS = {
+    1: u"Subcorpus",
+    2: u"BaseVerb",
+    3: u"Lemma",
+    4: u"GrammaticalForm",
+    5: u"PrefixValue",
+    6: u"Prefix",
+    7: u"SuffixValue",
+    8: u"Suffix",
+    9: u"SourceName",
+    10: u"SourceDateBegin",
+    11: u"SourceDateMiddle",
+    12: u"SourceDateEnd",
+    13: u"NumberOfTokens",
+    14: u"ResultsPageIndex"
+    }
+
+class DelimitedExporter(object):
+    """Stream results rows to a delimited text file (CSV, TSV, ...).
+
+    The file is opened once and written through csv.writer, with the
+    columns of RESULT_HEADERS in order, quoting where needed and a header
+    line at the top of a new file. Rows are appended to an existing file.
+    """
+
+    def __init__(self, file_name, delimiter=",", compress=None,
+                 flush_interval=5.0):
+        """Open file_name for appending.
+
+        Parameters
+        ----------
+          file_name (str): name of the output file
+          delimiter (str): field separator, e.g., '\\t' for TSV
+          compress (bool): gzip the output (default: if file_name ends
+            in '.gz')
+          flush_interval (float): seconds between flushes of the buffered
+            rows to disk (0 flushes after every write)
+        """
+        if compress is None:
+            compress = file_name.endswith(".gz")
+        self.file_name = file_name
+        self.flush_interval = flush_interval
+        self.columns = sorted(RESULT_HEADERS)
+        new_file = (not os.path.exists(file_name)
+                    or os.path.getsize(file_name) == 0)
+        if compress:
+            self.stream = gzip.open(file_name, "ab")
+        else:
+            self.stream = open(file_name, "ab")
+        self.writer = csv.writer(self.stream, delimiter=delimiter,
+                                 lineterminator="\n")
+        self.last_flush = time.time()
+        if new_file:
+            self.write_row(RESULT_HEADERS)
+
+    def _encode(self, value):
+        ## the Python 2 csv module only handles byte strings
+        if value is None:
+            return ""
+        if isinstance(value, unicode):
+            return value.encode("utf-8")
+        return value
+
+    def write_row(self, row):
+        """Write one row dict (column number -> value)."""
+        self.writer.writerow([self._encode(row.get(k))
+                              for k in self.columns])
+        self._maybe_flush()
+
+    def write_rows(self, rows):
+        """Write every row dict of an iterable."""
+        encode = self._encode
+        columns = self.columns
+        self.writer.writerows([encode(row.get(k)) for k in columns]
+                              for row in rows)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows to disk."""
+        self.stream.flush()
+        self.last_flush = time.time()
+
+    def close(self):
+        if not self.stream.closed:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class ParquetExporter(object):
+    """Write results rows to a typed, columnar Parquet file.
+
+    Rows are buffered and written batch_size at a time (one row group per
+    batch). Subcorpus, grammatical form, prefix and suffix columns are
+    dictionary-encoded, dates are floats and counts are integers, so pandas
+    can load the file without parsing strings or guessing types. Requires
+    pyarrow.
+    """
+
+    ## column number -> arrow type; other columns are strings
+    dictionary_columns = (1, 4, 5, 6, 7, 8)
+    float_columns = (10, 11, 12)
+    int_columns = (13, 14)
+
+    def __init__(self, file_name, batch_size=10000):
+        """Open file_name for writing.
+
+        Parameters
+        ----------
+          file_name (str): name of the output file
+          batch_size (int): number of rows in each written batch
+        """
+        if pa is None:
+            raise ImportError("ParquetExporter needs pyarrow")
+        self.file_name = file_name
+        self.batch_size = batch_size
+        self.columns = sorted(RESULT_HEADERS)
+        fields = []
+        for k in self.columns:
+            if k in self.dictionary_columns:
+                t = pa.dictionary(pa.int32(), pa.string())
+            elif k in self.float_columns:
+                t = pa.float64()
+            elif k in self.int_columns:
+                t = pa.int64()
+            else:
+                t = pa.string()
+            fields.append(pa.field(RESULT_HEADERS[k], t))
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(file_name, self.schema)
+        self.pending = []
+
+    def write_row(self, row):
+        """Buffer one row dict (column number -> value)."""
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        """Buffer every row dict of an iterable."""
+        for row in rows:
+            self.write_row(row)
+
+    def _column(self, k, rows):
+        values = [row.get(k) for row in rows]
+        if k in self.float_columns:
+            return pa.array(values, type=pa.float64())
+        if k in self.int_columns:
+            return pa.array(values, type=pa.int64())
+        values = [None if v is None else to_unicode_or_bust(v)
+                  for v in values]
+        array = pa.array(values, type=pa.string())
+        if k in self.dictionary_columns:
+            array = array.dictionary_encode()
+        return array
+
+    def flush(self):
+        """Write the buffered rows as one batch."""
+        if not self.pending:
+            return
+        batch = pa.RecordBatch.from_arrays(
+            [self._column(k, self.pending) for k in self.columns],
+            schema=self.schema)
+        self.writer.write_table(pa.Table.from_batches([batch]))
+        self.pending = []
+
+    def close(self):
+        """Write the last batch and finish the file."""
+        if self.writer is not None:
+            self.flush()
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 class ResultsSpreadsheet(openpyxl.Workbook):
-    """Excel spreadsheet containing search results."""
+    """Excel spreadsheet containing search results.
+
+    The workbook is write-only: each row is streamed to a temporary file as
+    soon as it is written instead of being kept in memory until save_wb(),
+    so memory use does not grow with the number of results. Rows must
+    therefore be written in order. When a sheet reaches max_rows, a new
+    sheet ("Results 2", "Results 3", ...) is started, beginning with the
+    header row if write_headers() was called.
+    """
 
-    def __init__(self, filename, csv=False):
+    ## row limit of an .xlsx worksheet
+    max_rows = 1048576
+
+    def __init__(self, filename, csv=False, max_rows=None, parquet=False):
         """Initialize results spreadsheet.
 
         Parameters
         ----------
           filename: name of the results spreadsheet (and of csv if selected)
-          csv: True or False — write output to a plain-text file also.
+          csv: True or False — write output to a plain-text file also
+            (filename + '.txt', ';'-separated, see DelimitedExporter).
+          max_rows: rows per sheet (default: the .xlsx limit)
+          parquet: True or False — write output to a Parquet file also
+            (filename + '.parquet', see ParquetExporter; needs pyarrow).
         """
-        super(ResultsSpreadsheet, self).__init__()
+        super(ResultsSpreadsheet, self).__init__(write_only=True)
         self.filename = filename
-        self.active.title = "Results"
+        if max_rows is not None:
+            self.max_rows = max_rows
+        self.textfile = None
+        self.exporter = None
         if csv == True:
             self.textfile = self.filename + ".txt"
+            self.exporter = DelimitedExporter(self.textfile, delimiter=";")
+        self.parquet_file = None
+        self.parquet_exporter = None
+        if parquet == True:
+            self.parquet_file = self.filename + ".parquet"
+            self.parquet_exporter = ParquetExporter(self.parquet_file)
+
+        ## row_idx of the next row, counted across all sheets
+        self.next_row = 1
+        self.header_row = None
+        self.sheet = None
+        self.sheet_rows = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        """Start the next results sheet."""
+        n = len(self.worksheets) + 1
+        if n == 1:
+            title = u"Results"
+        else:
+            title = u"Results {}".format(n)
+        self.sheet = self.create_sheet(title=title)
+        self.sheet_rows = 0
+        if self.header_row is not None:
+            self._append(self.header_row)
+
+    def _append(self, values):
+        """Append values to the current sheet, rotating it when full."""
+        if self.sheet_rows >= self.max_rows:
+            self._new_sheet()
+        self.sheet.append(values)
+        self.sheet_rows += 1
+
+    def write_row(self, row_idx, dict_contents):
+        """Write dict to row number row_idx in the ResultsSpreadsheet.
+
+        Parameters
+        ----------
+          row_idx: an integer representing a row number. Rows are streamed,
+            so row_idx may skip rows (left blank) but not go back.
+          dict_contents: a dictionary in which the keys are column numbers
+            and the values are the corresponding contents, e.g., {1: 'Modern'}.
+        """
+        if row_idx < self.next_row:
+            raise ValueError("Row {} has already been written (next row is "
+                             "{})".format(row_idx, self.next_row))
+        while self.next_row < row_idx:
+            self._append([])
+            self.next_row += 1
+
+        values = [None] * max(dict_contents or [0])
+        for k, v in dict_contents.iteritems():
+            values[k - 1] = v
+        ## formatting every row is costly, so only do it when it is logged
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(u"ROW %d: %s", row_idx, u"; ".join(
+                u"{}".format(to_unicode_or_bust(v))
+                for v in values if v is not None))
+        self._append(values)
+        self.next_row += 1
+
+    def save_wb(self):
+        """Save the ResultsSpreadsheet (and any text or Parquet file)."""
+
+        self.save("{}.xlsx".format(self.filename))
+        if self.exporter is not None:
+            self.exporter.close()
+        if self.parquet_exporter is not None:
+            self.parquet_exporter.close()
+
+    def write_headers(self):
+        """Add headers in first row of spreadsheet."""
+
+        self.write_row(row_idx=1, dict_contents=RESULT_HEADERS)
+        self.header_row = [RESULT_HEADERS[k] for k in sorted(RESULT_HEADERS)]
+
+    def write_dicts_to_txt(self, list_of_dicts):
+        """Write a list of dicts to the plain-text and/or Parquet file."""
+
+        if self.exporter is not None:
+            self.exporter.write_rows(list_of_dicts)
+        if self.parquet_exporter is not None:
+            self.parquet_exporter.write_rows(list_of_dicts)
+
+
+class RNCSource(object):
+    """One source in RNC search results."""
+
+    def __init__(self, source_name_as_string):
+        self.source = source_name_as_string
+        self.name = re.sub(r'\([^)]*\)', '', self.source)
+
+        date_seq = re.findall(r'\d{4}-\d{4}', self.source)
+        if date_seq:
+            self.date_begin = float(date_seq[0].split('-')[0])
+            self.date_end = float(date_seq[0].split('-')[1])
+            self.date_middle = (self.date_begin + self.date_end) / 2.0
+
+        else:
+            dates = re.findall(r'\d{4}', self.source)
+            if dates:
+                self.date_begin = float(dates[0])
+                self.date_middle = float(dates[0])
+                self.date_end = float(dates[0])
+            else:
+                self.date_begin = 0
+                self.date_middle = 0
+                self.date_end = 0
+
+class MyOpener(FancyURLopener):
+    """FancyURLopener object with custom User-Agent field."""
+
+    ## regular Mac Safari browser:
+    version = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_3) "
+        "AppleWebKit/600.5.17 (KHTML, like Gecko) Version/8.0.5 "
+        "Safari/600.5.17"
+        )
+
+    ## identify this web scraper as such
+    ## and link to a page with a description of its purpose:
+    #version = ("Web scraper created by Matt Menzenski. "
+    #           "See www.menzenski.com/scraper for more information.")
+
+class HTTPError(IOError):
+    """Non-2xx response from the corpus server."""
+
+    def __init__(self, status, url, retry_after=None):
+        """Initialize the error.
+
+        Parameters
+        ----------
+          status (int): HTTP status code of the response
+          url (str): address that was requested
+          retry_after (float): seconds the server asked us to wait (from the
+            Retry-After header), or None
+        """
+        IOError.__init__(self, "HTTP {} for {}".format(status, url))
+        self.status = status
+        self.url = url
+        self.retry_after = retry_after
+
+def parse_retry_after(value):
+    """Return the seconds to wait given a Retry-After header, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0.0, mktime_tz(date) - time.time())
+
+class HTTPSession(object):
+    """Pool of keep-alive HTTP connections shared by all Webpage objects."""
+
+    def __init__(self, timeout=30, max_idle_per_host=4, max_redirects=5,
+                 user_agent=MyOpener.version):
+        """Initialize an empty connection pool.
+
+        Parameters
+        ----------
+          timeout (float): socket timeout in seconds for each connection
+          max_idle_per_host (int): idle connections kept open for each host
+          max_redirects (int): redirects followed before giving up
+          user_agent (str): value of the User-Agent header
+        """
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.max_redirects = max_redirects
+        self.user_agent = user_agent
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def _connect(self, scheme, netloc):
+        """Return an idle connection to netloc, or open a new one."""
+        with self.lock:
+            pool = self.idle.get((scheme, netloc))
+            if pool:
+                return pool.pop(), True
+        if scheme == "https":
+            conn = httplib.HTTPSConnection(netloc, timeout=self.timeout)
+        else:
+            conn = httplib.HTTPConnection(netloc, timeout=self.timeout)
+        return conn, False
+
+    def _release(self, scheme, netloc, conn):
+        """Return conn to the pool, or close it if the pool is full."""
+        with self.lock:
+            pool = self.idle.setdefault((scheme, netloc), [])
+            if len(pool) < self.max_idle_per_host:
+                pool.append(conn)
+                return
+        conn.close()
+
+    def _request(self, scheme, netloc, path):
+        """Send one GET request, retrying once if a pooled socket went stale.
+
+        Returns
+        -------
+          status, headers, body (tup): status code, HTTPMessage, raw body
+        """
+        headers = {
+            "User-Agent": self.user_agent,
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+            }
+        while True:
+            conn, reused = self._connect(scheme, netloc)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (httplib.HTTPException, socket.error) as e:
+                conn.close()
+                if reused:
+                    continue
+                raise IOError("{}: {}".format(type(e).__name__, e))
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(scheme, netloc, conn)
+            return response.status, response.msg, body
+
+    def get(self, url):
+        """Return the (decompressed) body of url.
+
+        Raises IOError on connection errors and bodies that cannot be
+        decompressed, and HTTPError on non-2xx responses.
+        """
+        ## quote non-ASCII search terms the same way FancyURLopener does
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        url = quote(url, safe="%/:=&?~#+!$,;'@()*[]|")
+        for i in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            status, headers, body = self._request(parts.scheme, parts.netloc,
+                                                  path)
+            if status in (301, 302, 303, 307, 308) and headers.get("location"):
+                url = urljoin(url, headers.get("location"))
+                continue
+            if not 200 <= status < 300:
+                raise HTTPError(status, url, retry_after=parse_retry_after(
+                    headers.get("retry-after")))
+            encoding = (headers.get("content-encoding") or "").lower()
+            try:
+                if encoding == "gzip":
+                    body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+                elif encoding == "deflate":
+                    try:
+                        body = zlib.decompress(body)
+                    except zlib.error:
+                        body = zlib.decompress(body, -zlib.MAX_WBITS)
+            except zlib.error as e:
+                ## e.g. a truncated body, which is worth another try
+                raise IOError("Corrupt {} body from {}: {}".format(
+                    encoding, url, e))
+            return body
+        raise IOError("Too many redirects for {}".format(url))
+
+    def close(self):
+        """Close every idle connection."""
+        with self.lock:
+            for pool in self.idle.values():
+                for conn in pool:
+                    conn.close()
+            self.idle = {}
+
+## session used by every Webpage unless another one is passed in
+SESSION = HTTPSession()
+
+class CacheMiss(Exception):
+    """Raised for pages missing from a ResponseCache in offline mode."""
+    pass
+
+def normalize_url(url):
+    """Return url with sorted query parameters and empty ones dropped.
+
+    Two RNC search urls that differ only in parameter order (as produced by
+    iterating over RNCQuery*.params) normalize to the same string.
+    """
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query,
+                   keep_blank_values=True) if v != "")
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                       parts.path, urlencode(query), ""))
+
+class ResponseCache(object):
+    """Compressed HTML of fetched pages, stored in a single SQLite file."""
+
+    def __init__(self, file_name="thrunc_cache.db", ttl=None,
+                 max_bytes=None, offline=False):
+        """Open (or create) the cache.
+
+        Parameters
+        ----------
+          file_name (str): name of the SQLite file
+          ttl (float): seconds a page stays fresh; None means forever
+          max_bytes (int): compressed size above which the least recently
+            used pages are evicted; None means no limit
+          offline (bool): serve pages from the cache only, never the network
+        """
+        self.file_name = file_name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_name, check_same_thread=False)
+        self.conn.execute(u"CREATE TABLE IF NOT EXISTS pages (key TEXT "
+                          u"PRIMARY KEY, url TEXT, body BLOB, size INT, "
+                          u"created REAL, accessed REAL)")
+        self.conn.execute(u"CREATE INDEX IF NOT EXISTS pages_accessed "
+                          u"ON pages (accessed)")
+        self.conn.commit()
+
+    def key(self, url):
+        """Return the cache key of url."""
+        return hashlib.sha1(normalize_url(url)).hexdigest()
+
+    def get(self, url):
+        """Return the cached HTML of url, or None if missing or expired."""
+        key = self.key(url)
+        with self.lock:
+            row = self.conn.execute(u"SELECT body, created FROM pages "
+                                    u"WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            body, created = row
+            now = time.time()
+            if self.ttl is not None and now - created > self.ttl:
+                return None
+            self.conn.execute(u"UPDATE pages SET accessed = ? WHERE key = ?",
+                              (now, key))
+            self.conn.commit()
+        return zlib.decompress(str(body))
+
+    def put(self, url, body):
+        """Store the HTML of url and evict old pages if over max_bytes."""
+        data = zlib.compress(body, 6)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(u"INSERT OR REPLACE INTO pages VALUES "
+                              u"(?, ?, ?, ?, ?, ?)", (self.key(url),
+                              normalize_url(url), sqlite3.Binary(data),
+                              len(data), now, now))
+            if self.max_bytes is not None:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Delete least recently used pages until under max_bytes."""
+        total = self.conn.execute(
+            u"SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self.conn.execute(
+                u"SELECT key, size FROM pages ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self.conn.executemany(u"DELETE FROM pages WHERE key = ?", doomed)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+## cache consulted by every Webpage unless another one is passed in
+RESPONSE_CACHE = None
+
+## size cap and lifetime of the response caches opened by run_for_real and
+## RNCSearchTerm.search_all
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_TTL = 30 * 24 * 3600.0
+
+class PageCheckpoint(object):
+    """Durable record of every results page scraped by RNCSearch.
+
+    scrape_pages() records each page (its url, index and parsed rows) as
+    soon as it is scraped, so a search that dies on page 180 of 200
+    resumes from page 180 instead of page 0.
+    """
+
+    def __init__(self, file_name="thrunc_pages.db"):
+        """Open (or create) the checkpoint file.
+
+        Parameters
+        ----------
+          file_name (str): name of the SQLite file
+        """
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_name, check_same_thread=False,
+                                    timeout=60)
+        self.conn.execute(u"CREATE TABLE IF NOT EXISTS searches (key TEXT "
+                          u"PRIMARY KEY, documents INT, contexts INT, "
+                          u"finished INT DEFAULT 0)")
+        self.conn.execute(u"CREATE TABLE IF NOT EXISTS pages (key TEXT, "
+                          u"pageIndex INT, url TEXT, rows TEXT, listed INT, "
+                          u"PRIMARY KEY (key, pageIndex))")
+        ## files written before listed was recorded
+        columns = [row[1] for row in self.conn.execute(
+            u"PRAGMA table_info(pages)")]
+        if u"listed" not in columns:
+            self.conn.execute(u"ALTER TABLE pages ADD COLUMN listed INT")
+        self.conn.commit()
+
+    def load(self, key):
+        """Return what has been recorded for the search with this key.
+
+        Returns
+        -------
+          None if nothing was recorded, otherwise a tuple
+          (documents, contexts, finished, pages, listed) where pages is the
+          list of row lists of the consecutive pages recorded from p=0
+          onwards, and listed the number of documents they list
+        """
+        with self.lock:
+            search = self.conn.execute(
+                u"SELECT documents, contexts, finished FROM searches "
+                u"WHERE key = ?", (key,)).fetchone()
+            if search is None:
+                return None
+            pages = []
+            listed = 0
+            for idx, rows, page_listed in self.conn.execute(
+                    u"SELECT pageIndex, rows, listed FROM pages WHERE key = ? "
+                    u"ORDER BY pageIndex", (key,)):
+                if idx != len(pages):
+                    break
+                pages.append([self._load_row(row) for row in
+                              json.loads(rows)])
+                if page_listed is None:
+                    page_listed = len(pages[-1])
+                listed += page_listed
+        return search[0], search[1], bool(search[2]), pages, listed
+
+    def _load_row(self, row):
+        """Turn a row dict back into the form built by RNCSearch.add_row."""
+        row = dict((int(k), v) for k, v in row.iteritems())
+        for k in range(1, 9):
+            if isinstance(row[k], unicode):
+                row[k] = row[k].encode('utf-8')
+        return row
+
+    def record(self, key, idx, url, rows, documents=None, contexts=None,
+               listed=None):
+        """Durably save one scraped page.
+
+        Parameters
+        ----------
+          key (str): identifies the search (its normalized base url)
+          idx (int): number of the results page
+          url (str): address of the page
+          rows (list): row dicts scraped from the page
+          documents, contexts (int): totals, recorded with page 0
+          listed (int): documents listed on the page, including those
+            without a row (default: the number of rows)
+        """
+        with self.lock:
+            with self.conn:
+                if idx == 0:
+                    self.conn.execute(
+                        u"INSERT OR REPLACE INTO searches (key, documents, "
+                        u"contexts, finished) VALUES (?, ?, ?, 0)",
+                        (key, documents, contexts))
+                ## sqlite3 only takes unicode text, and the url of a
+                ## Cyrillic query is a utf-8 byte string
+                self.conn.execute(
+                    u"INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                    (key, idx, to_unicode_or_bust(url), json.dumps(rows),
+                     listed))
+
+    def finish(self, key, documents=None, contexts=None):
+        """Record that the search with this key has no more pages."""
+        with self.lock:
+            with self.conn:
+                cursor = self.conn.execute(
+                    u"UPDATE searches SET finished = 1 WHERE key = ?", (key,))
+                if cursor.rowcount == 0:
+                    self.conn.execute(
+                        u"INSERT INTO searches VALUES (?, ?, ?, 1)",
+                        (key, documents, contexts))
+
+    def discard(self, key):
+        """Forget a search, e.g. once its results are stored elsewhere."""
+        with self.lock:
+            with self.conn:
+                self.conn.execute(u"DELETE FROM pages WHERE key = ?", (key,))
+                self.conn.execute(u"DELETE FROM searches WHERE key = ?",
+                                  (key,))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+## checkpoint used by every RNCSearch.scrape_pages unless another one is
+## passed in
+PAGE_CHECKPOINT = None
+
+## parameters that only change how the results are paged
+PAGING_PARAMS = ("p", "dpp", "spp", "spd")
+
+def query_key(params):
+    """Return a key identifying the query with these parameters.
+
+    The key does not depend on the order of params, on whether values are
+    unicode or utf-8 strings, or on the paging parameters (PAGING_PARAMS),
+    e.g. the page size set by negotiate_page_size.
+    """
+    items = sorted((to_unicode_or_bust(k), u"{}".format(to_unicode_or_bust(v)))
+                   for k, v in params.iteritems() if k not in PAGING_PARAMS)
+    return hashlib.sha1(json.dumps(items).encode('utf-8')).hexdigest()
+
+class NegativeCache(object):
+    """Queries known to find nothing, stored in a single SQLite file.
+
+    RNCSearch.scrape_pages records every query whose first page is empty
+    and skips queries recorded here without fetching anything.
+    """
+
+    def __init__(self, file_name="thrunc_empty.db", ttl=None):
+        """Open (or create) the cache.
+
+        Parameters
+        ----------
+          file_name (str): name of the SQLite file
+          ttl (float): seconds an empty result is trusted; None means
+            forever (the corpus rarely gains texts)
+        """
+        self.file_name = file_name
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_name, check_same_thread=False,
+                                    timeout=60)
+        self.conn.execute(u"CREATE TABLE IF NOT EXISTS empty (key TEXT "
+                          u"PRIMARY KEY, params TEXT, created REAL)")
+        self.conn.commit()
+
+    def is_empty(self, params):
+        """Return True if the query with params is known to find nothing."""
+        with self.lock:
+            row = self.conn.execute(u"SELECT created FROM empty WHERE "
+                                    u"key = ?", (query_key(params),)
+                                    ).fetchone()
+        if row is None:
+            return False
+        return self.ttl is None or time.time() - row[0] <= self.ttl
+
+    def add(self, params):
+        """Record that the query with params finds nothing."""
+        items = dict((to_unicode_or_bust(k),
+                      u"{}".format(to_unicode_or_bust(v)))
+                     for k, v in params.iteritems())
+        with self.lock:
+            with self.conn:
+                self.conn.execute(
+                    u"INSERT OR REPLACE INTO empty VALUES (?, ?, ?)",
+                    (query_key(params), json.dumps(items, sort_keys=True),
+                     time.time()))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+## negative cache used by every RNCSearch.scrape_pages unless another one
+## is passed in
+NEGATIVE_CACHE = None
+
+class RetryPolicy(object):
+    """Exponential backoff with full jitter and a cap on attempts."""
+
+    def __init__(self, max_attempts=6, base_delay=2.0, max_delay=300.0):
+        """Initialize the policy.
+
+        Parameters
+        ----------
+          max_attempts (int): requests made for one page before giving up
+          base_delay (float): backoff in seconds after the first failure
+          max_delay (float): largest backoff in seconds
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, error):
+        """Return True if a request that failed with error may be retried.
+
+        Connection errors, 429 Too Many Requests and 5xx responses are
+        retried; other HTTP errors (e.g. 404) are not.
+        """
+        if isinstance(error, HTTPError):
+            return error.status == 429 or error.status >= 500
+        return True
+
+    def delay(self, attempt, error=None):
+        """Return the seconds to wait after failed attempt number attempt.
+
+        Parameters
+        ----------
+          attempt (int): number of the failed attempt, starting from 0
+          error (IOError): the failure; its retry_after (if any) is honoured
+        """
+        backoff = random.uniform(0, min(self.max_delay,
+                                        self.base_delay * 2 ** attempt))
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            backoff = max(backoff, min(retry_after, self.max_delay))
+        return backoff
+
+class CircuitBreaker(object):
+    """Pause every worker while the corpus server is unhealthy.
+
+    After failure_threshold consecutive failures the circuit opens and
+    wait() blocks all callers for reset_timeout seconds. Then one trial
+    request is let through: success closes the circuit, failure reopens
+    it. A Retry-After from the server also holds the circuit open.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        """Initialize a closed circuit.
+
+        Parameters
+        ----------
+          failure_threshold (int): consecutive failures that open the circuit
+          reset_timeout (float): seconds to stay open before a trial request
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        """'closed', 'open' or 'half-open'."""
+        with self.lock:
+            if time.time() < self.open_until:
+                return "open"
+            if self.failures >= self.failure_threshold:
+                return "half-open"
+            return "closed"
+
+    def wait(self):
+        """Block until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.time()
+                if now >= self.open_until:
+                    if self.failures < self.failure_threshold:
+                        return
+                    if not self.trial_in_flight:
+                        self.trial_in_flight = True
+                        return
+                    pause = 1.0
+                else:
+                    pause = self.open_until - now
+            time.sleep(pause)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self, retry_after=None):
+        """Count a failed request.
+
+        Parameters
+        ----------
+          retry_after (float): seconds the server asked us to wait, if any
+        """
+        with self.lock:
+            now = time.time()
+            self.failures += 1
+            self.trial_in_flight = False
+            if retry_after is not None:
+                self.open_until = max(self.open_until, now + retry_after)
+            if self.failures >= self.failure_threshold:
+                self.open_until = max(self.open_until,
+                                      now + self.reset_timeout)
+                log.warning(u"Circuit open for %.0f seconds after %d "
+                            u"failures.", self.open_until - now,
+                            self.failures)
+
+## retry policy and circuit breaker used by every Webpage unless others
+## are passed in
+RETRY_POLICY = RetryPolicy()
+BREAKER = CircuitBreaker()
+
+class AdaptivePacer(object):
+    """Process-wide delay between requests, tuned from server behaviour.
+
+    The delay shrinks additively after each quick, successful response and
+    grows multiplicatively after each failure or slow response (AIMD).
+    The hard limit on the request rate is the budget of each host (see
+    HOST_BUDGETS), which every Webpage waits on as well, so the pacer
+    starts above it and speeds up to it while the server keeps up.
+    """
+
+    def __init__(self, initial_delay=4.0, min_delay=2.0, max_delay=60.0,
+                 step=0.25, backoff=2.0, slow_latency=5.0):
+        """Initialize the pacer.
+
+        Parameters
+        ----------
+          initial_delay (float): seconds between requests at start-up
+          min_delay, max_delay (float): bounds of the delay in seconds; a
+            min_delay shorter than the interval of the host budget (2 s by
+            default) has no effect
+          step (float): seconds taken off the delay after a success
+          backoff (float): factor the delay is multiplied by after a failure
+          slow_latency (float): responses slower than this many seconds
+            count as a sign of an overloaded server
+        """
+        self.delay = float(initial_delay)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.step = step
+        self.backoff = backoff
+        self.slow_latency = slow_latency
+        self.next_start = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until this caller's turn to send a request.
+
+        Returns
+        -------
+          pause (float): number of seconds spent waiting
+        """
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_start)
+            self.next_start = start + self.delay
+        pause = start - now
+        if pause > 0:
+            time.sleep(pause)
+        return pause
+
+    def record(self, latency, ok=True):
+        """Adjust the delay after a response.
+
+        Parameters
+        ----------
+          latency (float): seconds the request took
+          ok (bool): False if the request failed in a way that suggests the
+            server is overloaded
+        """
+        with self.lock:
+            if ok and latency <= self.slow_latency:
+                self.delay = max(self.min_delay, self.delay - self.step)
+            else:
+                self.delay = min(self.max_delay, self.delay * self.backoff)
 
-    def write_row(self, row_idx, dict_contents):
-        """Write dict to row number row_idx in the ResultsSpreadsheet.
+## pacer shared by every Webpage in the process unless another one is
+## passed in
+PACER = AdaptivePacer()
+
+class Webpage(object):
+    """Generic webpage with attributes."""
+
+    def __init__(self, address, limiter=None, session=None, cache=None,
+                 retry=None, breaker=None, pacer=None):
+        """Open a webpage and parse its contents.
 
         Parameters
         ----------
-          row_idx: an integer representing a row number.
-          dict_contents: a dictionary in which the keys are column numbers
-            and the values are the corresponding contents, e.g., {1: 'Modern'}.
+          address (str): url of the page
+          limiter (TokenBucket): per-host rate limit to wait on before the
+            request, in addition to the pacer (default: the bucket of the
+            host of address, see HOST_BUDGETS)
+          session (HTTPSession): connection pool to use (default: SESSION)
+          cache (ResponseCache): cache to read from and write to (default:
+            RESPONSE_CACHE). Cached pages are served without any delay.
+          retry (RetryPolicy): backoff between failed attempts (default:
+            RETRY_POLICY). The last error is raised once it gives up.
+          breaker (CircuitBreaker): circuit shared by all workers (default:
+            BREAKER)
+          pacer (AdaptivePacer): delay between requests, shared by the whole
+            process (default: PACER)
         """
-        print "ROW:\t{}".format(row_idx)
-        for k, v in dict_contents.iteritems():
-            c = self.active.cell(row=row_idx, column=k)
-            c.value = v
-
-            ## also print dict contents to console
+        self.address = address
+        self.from_cache = False
+        self._soup = None
+        self._results = None
+        if session is None:
+            session = SESSION
+        if cache is None:
+            cache = RESPONSE_CACHE
+        if retry is None:
+            retry = RETRY_POLICY
+        if breaker is None:
+            breaker = BREAKER
+        if pacer is None:
+            pacer = PACER
+        if limiter is None:
+            limiter = host_bucket(self.address)
+
+        if cache is not None:
+            self.html = cache.get(self.address)
+            if self.html is not None:
+                self.from_cache = True
+                return
+            if cache.offline:
+                raise CacheMiss(self.address)
+
+        delay = 0.0
+        for attempt in range(retry.max_attempts):
+            breaker.wait()
+            delay += limiter.acquire()
+            delay += pacer.wait()
             try:
-                print "{}:\t{}".format(k, v)
-            except UnicodeEncodeError as e:
-                print "{}:\tUnicodeEncodeError: {}".format(k, e)
-            except UnicodeDecodeError as e:
-                print "{}:\tUnicodeDecodeError: {}".format(k, e)
+                log.debug(u"Trying with a delay of %.1f seconds to open %s",
+                          delay, self.address)
+                start = time.time()
+                self.html = session.get(self.address)
+                pacer.record(time.time() - start)
+                breaker.record_success()
+                break
+            except IOError as e:
+                log.warning(u"IOError: %s (%s)", e, self.address)
+                if not retry.is_retryable(e):
+                    ## the server answered, so it is healthy
+                    pacer.record(time.time() - start)
+                    breaker.record_success()
+                    raise
+                pacer.record(time.time() - start, ok=False)
+                breaker.record_failure(
+                    retry_after=getattr(e, "retry_after", None))
+                if attempt + 1 == retry.max_attempts:
+                    raise
+                delay = retry.delay(attempt, error=e)
+                time.sleep(delay)
             except:
-                print "Unexpected error: {}".format(sys.exc_info()[0])
+                ## never leave a half-open circuit waiting for this trial
+                breaker.record_failure()
                 raise
 
-        print "\n"
-
-    def save_wb(self):
-        """Save the ResultsSpreadsheet to disk."""
-
-        self.save("{}.xlsx".format(self.filename))
-
-    def write_headers(self):
-        """Add headers in first row of spreadsheet."""
-
-        header_dict = {
-            1: u"Subcorpus",
-            2: u"BaseVerb",
-            3: u"Lemma",
-            4: u"GrammaticalForm",
-            5: u"PrefixValue",
-            6: u"Prefix",
-            7: u"SuffixValue",
-            8: u"Suffix",
-            9: u"SourceName",
-            10: u"SourceDateBegin",
-            11: u"SourceDateMiddle",
-            12: u"SourceDateEnd",
-            13: u"NumberOfTokens",
-            14: u"ResultsPageIndex"
-            }
-
-        self.write_row(row_idx=1, dict_contents=header_dict)
-
-        try:
-            with codecs.open(self.textfile, "a", encoding="utf-8") as stream:
-                stream.write(u"\n")
-                for k, v in header_dict.iteritems():
-                    u_v = to_unicode_or_bust(v)
-                    try:
-                        stream.write(u"{};".format(u_v))
-                    except UnicodeDecodeError as e:
-                        print "UDE: {}".format(e)
-                        raise
-                    except UnicodeEncodeError as e:
-                        print "UEE: {}".format(e)
-                        raise
-
-        except Exception as e:
-            print "Exception: {}".format(e)
-            raise
+        if cache is not None:
+            cache.put(self.address, self.html)
 
-    def write_dicts_to_txt(self, list_of_dicts):
-        """Write each dict in a list of dicts to a plain-text file."""
+    @property
+    def soup(self):
+        """BeautifulSoup() object of the page, built on first use."""
+        if self._soup is None:
+            self._soup = Soup(self.html)
+        return self._soup
 
-        try:
-            with codecs.open(self.textfile, "a", encoding="utf-8") as stream:
-                for d in list_of_dicts:
-                    stream.write(u"\n")
-                    for k, v in d.iteritems():
-                        u_v = to_unicode_or_bust(v)
-                        try:
-                            stream.write(u"{};".format(u_v))
-                        except UnicodeDecodeError as e:
-                            print "UDE: {}".format(e)
-                            raise
-                        except UnicodeEncodeError as e:
-                            print "UEE: {}".format(e)
-                            raise
+    @property
+    def results(self):
+        """ResultsPage() extracted from the page, built on first use."""
+        if self._results is None:
+            self._results = ResultsPage(self.html)
+        return self._results
 
-        except Exception as e:
-            print "Exception: {}".format(e)
-            raise
+class TokenBucket(object):
+    """Thread-safe token bucket: a politeness budget for one host."""
 
+    def __init__(self, rate, capacity=1):
+        """Initialize a full bucket.
 
-class RNCSource(object):
-    """One source in RNC search results."""
+        Parameters
+        ----------
+          rate (float): tokens added per second (i.e., requests per second)
+          capacity (int): largest burst of requests allowed at once
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.last = time.time()
+        self.lock = threading.Lock()
 
-    def __init__(self, source_name_as_string):
-        self.source = source_name_as_string
-        self.name = re.sub(r'\([^)]*\)', '', self.source)
+    def acquire(self):
+        """Block until a token is available, then take it.
 
-        date_seq = re.findall(r'\d{4}-\d{4}', self.source)
-        if date_seq:
-            self.date_begin = float(date_seq[0].split('-')[0])
-            self.date_end = float(date_seq[0].split('-')[1])
-            self.date_middle = (self.date_begin + self.date_end) / 2.0
+        Returns
+        -------
+          waited (float): number of seconds spent waiting for the token
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.capacity,
+                    self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                pause = (1 - self.tokens) / self.rate
+            time.sleep(pause)
+            waited += pause
+
+## requests per second and burst size for each corpus host: the one limit
+## on the request rate, however many threads share it
+HOST_BUDGETS = {
+    "search.ruscorpora.ru": (0.5, 2),
+    "search-beta.ruscorpora.ru": (0.5, 2),
+    }
+DEFAULT_HOST_BUDGET = (0.5, 2)
+
+_host_buckets = {}
+_host_buckets_lock = threading.Lock()
+
+def host_bucket(url):
+    """Return the TokenBucket shared by all requests to the host of url."""
+    host = urlsplit(url).netloc
+    with _host_buckets_lock:
+        if host not in _host_buckets:
+            rate, capacity = HOST_BUDGETS.get(host, DEFAULT_HOST_BUDGET)
+            _host_buckets[host] = TokenBucket(rate=rate, capacity=capacity)
+        return _host_buckets[host]
+
+class ConcurrentFetcher(object):
+    """Thread pool that scrapes many RNCSearch objects at once.
+
+    Each request waits on the TokenBucket of its host and on the shared
+    pacer, so total throughput is set by the politeness budget and not by
+    serial delays.
+    """
+
+    def __init__(self, workers=4):
+        """Initialize the fetcher.
 
-        else:
-            dates = re.findall(r'\d{4}', self.source)
-            if dates:
-                self.date_begin = float(dates[0])
-                self.date_middle = float(dates[0])
-                self.date_end = float(dates[0])
-            else:
-                self.date_begin = 0
-                self.date_middle = 0
-                self.date_end = 0
+        Parameters
+        ----------
+          workers (int): number of threads issuing requests
+        """
+        self.workers = workers
+
+    def _run(self, jobs, func):
+        """Apply func to every item of jobs using the worker threads."""
+        queue = Queue.Queue()
+        for job in jobs:
+            queue.put(job)
+        errors = []
+
+        def worker():
+            while True:
+                try:
+                    job = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    func(job)
+                except Exception as e:
+                    log.exception(u"Exception in fetcher thread: %s", e)
+                    errors.append(e)
+
+        threads = [threading.Thread(target=worker)
+                   for i in range(self.workers)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+    def scrape_searches(self, searches):
+        """Run scrape_pages() for every RNCSearch in searches.
 
-class MyOpener(FancyURLopener):
-    """FancyURLopener object with custom User-Agent field."""
+        Returns
+        -------
+          searches (list): the same RNCSearch objects, now scraped
+        """
+        searches = list(searches)
+        self._run(searches, lambda s: s.scrape_pages(
+            limiter=host_bucket(s.address)))
+        return searches
 
-    ## regular Mac Safari browser:
-    version = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_3) "
-        "AppleWebKit/600.5.17 (KHTML, like Gecko) Version/8.0.5 "
-        "Safari/600.5.17"
-        )
+    def fetch_pages(self, urls):
+        """Open every url in urls concurrently.
 
-    ## identify this web scraper as such
-    ## and link to a page with a description of its purpose:
-    #version = ("Web scraper created by Matt Menzenski. "
-    #           "See www.menzenski.com/scraper for more information.")
+        Returns
+        -------
+          pages (dict): Webpage objects keyed by url
+        """
+        pages = {}
 
-class Webpage(object):
-    """Generic webpage with attributes."""
+        def fetch(url):
+            pages[url] = Webpage(url, limiter=host_bucket(url))
 
-    def __init__(self, address):
-        self.address = address
-        myopener = MyOpener()
-        delay = random.randint(2,11)
-        time.sleep(delay)
+        self._run(urls, fetch)
+        return pages
 
-        unsuccessful = True
-        while unsuccessful:
-            long_delay = delay * 2
-            try:
-                print "Trying with a delay of {} seconds to open\n{}\n".format(
-                    delay, self.address
-                    )
-                self.html = myopener.open(self.address).read()
-                self.soup = Soup(self.html)
-                unsuccessful = False
-            except IOError as e:
-                print "\nIOError: {}\nAddress:{}\n".format(e, self.address)
-                long_delay *= 2
-                time.sleep(long_delay)
-                print "Now trying with a longer delay of {} seconds.\n".format(
-                    long_delay
-                    )
-                self.html = myopener.open(self.address).read()
-                self.soup = Soup(self.html)
+## documents per results page when a query does not set dpp
+DEFAULT_DPP = 10
 
 class RNCQueryAncient(object):
     """Object describing a query of the Ancient RNC subcorpus."""
 
+    ## address of the search server
+    base_url = "http://search-beta.ruscorpora.ru/search.xml?"
+    ## documents per page when dpp is not given (see negotiate_page_size)
+    default_dpp = None
+
     def __init__(self, mode="old_rus", text1="lexgramm",
             sort="gr_created", lang="ru",
             doc_docid="0|13|2|3|1|4|7|8|10|12|5|11|9|6",
             parent1=0, level1=0, lexi1="", gramm1="",
-            parent2=0, level2=0, min2=1, max2=1):
+            parent2=0, level2=0, min2=1, max2=1,
+            dpp="", spp="", spd=""):
         """Initialize with empty search parameters."""
 
         self.mode = mode
         self.text1 = text1
         self.doc_docid = doc_docid
+        self.dpp = dpp or self.default_dpp or ""
+        self.spp = spp
+        self.spd = spd
         self.parent1 = parent1
         self.level1 = level1
         self.lexi1 = lexi1
@@ -558,13 +2857,19 @@ class RNCQueryAncient(object):
             "level2": self.level2,
             "min2": self.min2,
             "max2": self.max2,
+            "dpp": self.dpp,
+            "spp": self.spp,
+            "spd": self.spd,
             }
 
-        self.base_url = "http://search-beta.ruscorpora.ru/search.xml?"
-
 class RNCQueryOld(object):
     """Object describing a query of the Old RNC subcorpus."""
 
+    ## address of the search server
+    base_url = "http://search-beta.ruscorpora.ru/search.xml?"
+    ## documents per page when dpp is not given (see negotiate_page_size)
+    default_dpp = None
+
     def __init__(self, env="alpha", mode="mid_rus", text="lexform",
             sort="gr_created", lang="ru", mycorp="", mysent="",
             mysize="", mysentsize="", mydocsize="", dpp="",
@@ -581,7 +2886,7 @@ class RNCQueryOld(object):
         self.mysize = mysize
         self.mysentsize = mysentsize
         self.mydocsize = mydocsize
-        self.dpp = dpp
+        self.dpp = dpp or self.default_dpp or ""
         self.spp = spp
         self.spd = spd
         self.req = req
@@ -603,11 +2908,14 @@ class RNCQueryOld(object):
             "req": self.req,
             }
 
-        self.base_url = "http://search-beta.ruscorpora.ru/search.xml?"
-
 class RNCQueryModern(object):
     """Object describing a query of the Modern RNC subcorpus."""
 
+    ## address of the search server
+    base_url = "http://search.ruscorpora.ru/search.xml?"
+    ## documents per page when dpp is not given (see negotiate_page_size)
+    default_dpp = None
+
     def __init__(self, mycorp="", mysent="", mysize="",
             dpp="", spp="", spd="", text="lexgramm",
             mode="main", sort="gr_tagging", lang="en",
@@ -621,7 +2929,7 @@ class RNCQueryModern(object):
         self.mycorp = mycorp
         self.mysent = mysent
         self.mysize = mysize
-        self.dpp = dpp
+        self.dpp = dpp or self.default_dpp or ""
         self.spp = spp
         self.spd = spd
         self.text = text
@@ -702,8 +3010,6 @@ class RNCQueryModern(object):
             self.params["m1"] = self.m1
             self.params["m2"] = self.m2
 
-        self.base_url = "http://search.ruscorpora.ru/search.xml?"
-
 class RNCSearch(object):
     """A search of one of the three historical RNC subcorpora."""
 
@@ -736,14 +3042,33 @@ class RNCSearch(object):
         self.suffix = suffix
 
         self.params = rnc_query.params
+        self.base_url = rnc_query.base_url
         self.address = rnc_query.base_url
         self.results_page_urls = []
 
+        ## totals reported on the first results page (set by scrape_pages)
+        self.documents = None
+        self.contexts = None
+
         ## list of dicts
         self.all_search_results = []
 
+        ## PageCheckpoint of this search and its key there (set by
+        ## scrape_pages)
+        self.checkpoint = None
+        self.checkpoint_key = None
+
+        ## also keep the highlighted hits of each source, as column 15
+        ## (used by QueryPlanner)
+        self.keep_hits = False
+
+        ## called with the index of each page once it is scraped, e.g. to
+        ## renew a lease (used by CrawlScheduler)
+        self.on_page = None
+
     def base_search_url(self):
         """Generate a search url from parameters."""
+        self.address = self.base_url
         for k, v in self.params.iteritems():
             self.address += "{}={}&".format(k, v)
 
@@ -772,113 +3097,854 @@ class RNCSearch(object):
 
         for source in sources_on_page:
             source_name = source.contents[0].string
-            src_obj = RNCSource(source_name)
             examples = re.search(ur'(\d+)', source.contents[4].string)
             if examples:
                 source_examples = int(examples.group(0))
             else:
                 source_examples = 0
+            self.add_row(source_name, source_examples, idx)
 
-            row_dict = {
-                1: "{}".format(self.subcorpus),
-                2: "{}".format(self.base_verb),
-                3: "{}".format(self.lem),
-                4: "{}".format(self.gramm_cat),
-                5: "{}".format(self.pfx_val),
-                6: "{}".format(self.prefix),
-                7: "{}".format(self.sfx_val),
-                8: "{}".format(self.suffix),
-                9: u"{}".format(source_name),
-                10: src_obj.date_begin,
-                11: src_obj.date_middle,
-                12: src_obj.date_end,
-                13: source_examples,
-                14: idx
-                }
-            self.all_search_results.append(row_dict)
+    def scrape_results_page(self, results, idx=0):
+        """Scrape the content of one page that was parsed into a ResultsPage.
+
+        Parameters
+        ----------
+          results: ResultsPage() object of a webpage
+          idx: number of the results page (e.g., idx=10 means p=10& in the url)
+        """
+        for i, (source_name, source_examples) in enumerate(results.sources):
+            self.add_row(source_name, source_examples, idx)
+            if self.keep_hits:
+                self.all_search_results[-1][15] = results.hits[i]
+
+    def add_row(self, source_name, source_examples, idx):
+        """Append the row dict for one source to all_search_results."""
+        src_obj = RNCSource(source_name)
+        row_dict = {
+            1: "{}".format(self.subcorpus),
+            2: "{}".format(self.base_verb),
+            3: "{}".format(self.lem),
+            4: "{}".format(self.gramm_cat),
+            5: "{}".format(self.pfx_val),
+            6: "{}".format(self.prefix),
+            7: "{}".format(self.sfx_val),
+            8: "{}".format(self.suffix),
+            9: u"{}".format(source_name),
+            10: src_obj.date_begin,
+            11: src_obj.date_middle,
+            12: src_obj.date_end,
+            13: source_examples,
+            14: idx
+            }
+        self.all_search_results.append(row_dict)
+
+    def probe(self, limiter=None, session=None, negative_cache=None):
+        """Return True if the query finds anything, fetching only page 0.
+
+        Parameters
+        ----------
+          limiter, session: see scrape_pages
+          negative_cache (NegativeCache): queries known to find nothing,
+            consulted and updated (default: NEGATIVE_CACHE)
+        """
+        if negative_cache is None:
+            negative_cache = NEGATIVE_CACHE
+        if negative_cache is not None and negative_cache.is_empty(
+                self.params):
+            return False
+        self.base_search_url()
+        results = Webpage(self.address + "p=0&", limiter=limiter,
+                          session=session).results
+        if not results.has_results and negative_cache is not None:
+            negative_cache.add(self.params)
+        return results.has_results
+
+    def discard_checkpoint(self):
+        """Forget the checkpointed pages, once the results are stored."""
+        if self.checkpoint is not None and self.checkpoint_key:
+            self.checkpoint.discard(self.checkpoint_key)
+
+    def page_size(self):
+        """Return the number of documents listed on each results page."""
+        try:
+            return int(self.params.get("dpp") or DEFAULT_DPP)
+        except ValueError:
+            return DEFAULT_DPP
 
-    def scrape_pages(self):
-        """More straightforward scraping method."""
+    def page_url(self, page_idx):
+        """Return the url of results page number page_idx."""
+        return self.address + "p=" + str(page_idx) + "&"
+
+    def _fetch_pages(self, page_indexes, limiter=None, session=None,
+                     fetcher=None):
+        """Return the ResultsPage of each page, in order.
+
+        With a fetcher the pages are fetched concurrently, otherwise one
+        at a time as they are consumed.
+        """
+        urls = [self.page_url(i) for i in page_indexes]
+        if fetcher is not None:
+            pages = fetcher.fetch_pages(urls)
+            return [pages[url].results for url in urls]
+        return (Webpage(url, limiter=limiter, session=session).results
+                for url in urls)
+
+    def _scrape_page(self, page_idx, results, checkpoint=None):
+        """Scrape one fetched page and checkpoint it.
+
+        Returns
+        -------
+          False if the page lists no results (it is past the last page)
+        """
+        if not results.has_results:
+            return False
+        log.debug(u"Page %d: %s", page_idx, self.page_url(page_idx))
+        first_row = len(self.all_search_results)
+        self.scrape_results_page(results, idx=page_idx)
+        PROGRESS.add(pages=1,
+                     rows=len(self.all_search_results) - first_row)
+        if checkpoint is not None:
+            checkpoint.record(self.checkpoint_key, page_idx,
+                              self.page_url(page_idx),
+                              self.all_search_results[first_row:],
+                              documents=self.documents,
+                              contexts=self.contexts,
+                              listed=results.listed)
+        if self.on_page is not None:
+            self.on_page(page_idx)
+        return True
+
+    def scrape_pages(self, limiter=None, session=None, checkpoint=None,
+                     negative_cache=None, fetcher=None):
+        """More straightforward scraping method.
+
+        The number of pages is worked out from the document total on page 0
+        and the page size (dpp, DEFAULT_DPP if not set), so the other pages
+        can be fetched concurrently and no empty page is fetched at the
+        end. Without a total, or if the pages list fewer documents than the
+        total, pages are fetched until an empty one.
+
+        Parameters
+        ----------
+          limiter (TokenBucket): rate limit shared with other searches of the
+            same host (see ConcurrentFetcher), on top of the shared pacer
+          session (HTTPSession): connection pool to use (default: SESSION)
+          checkpoint (PageCheckpoint): where each page is recorded as it is
+            scraped, and resumed from (default: PAGE_CHECKPOINT)
+          negative_cache (NegativeCache): queries known to find nothing,
+            which are skipped without a request; queries found to be empty
+            are added to it (default: NEGATIVE_CACHE)
+          fetcher (ConcurrentFetcher): fetch the pages after page 0
+            concurrently, a few per worker at a time
+        """
+        if checkpoint is None:
+            checkpoint = PAGE_CHECKPOINT
+        if negative_cache is None:
+            negative_cache = NEGATIVE_CACHE
 
         self.base_search_url()
         page_idx = 0
 
-        has_more_results = True
+        if negative_cache is not None and negative_cache.is_empty(
+                self.params):
+            log.debug(u"Skipping %s, which is known to find nothing.",
+                      self.address)
+            self.documents = self.contexts = 0
+            return
 
-        while has_more_results:
+        has_more_results = True
 
-            url = self.address
-            address = url + "p=" + str(page_idx) + "&"
-            page = Webpage(address)
-
-            if page.soup.ol:
-                if page.soup.ol.contents:
-                    if page.soup.ol.find_all('li'):
-                        print page_idx
-                        print address
-                        print "\n"
-                        self.scrape_one_page(soup=page.soup, idx=page_idx)
-                        page_idx += 1
-                    else:
+        ## documents listed so far
+        listed = 0
+
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+            self.checkpoint_key = normalize_url(self.address)
+            state = checkpoint.load(self.checkpoint_key)
+            if state is not None:
+                (self.documents, self.contexts, finished, pages,
+                 listed) = state
+                for rows in pages:
+                    self.all_search_results.extend(rows)
+                page_idx = len(pages)
+                has_more_results = not finished
+                log.info(u"Resuming %s from page %d.", self.address,
+                         page_idx)
+
+        if has_more_results and page_idx == 0:
+            results = Webpage(self.page_url(0), limiter=limiter,
+                              session=session).results
+            self.documents = results.documents
+            self.contexts = results.contexts
+            log.info(u"Found %s documents, %s contexts.",
+                     self.documents, self.contexts)
+            if self._scrape_page(0, results, checkpoint):
+                listed += results.listed
+                page_idx = 1
+            else:
+                has_more_results = False
+                if negative_cache is not None:
+                    negative_cache.add(self.params)
+
+        ## fetch the remaining pages, as counted from the document total
+        if has_more_results and self.documents:
+            n_pages = -(-self.documents // self.page_size())
+            if fetcher is not None:
+                chunk = 2 * fetcher.workers
+            else:
+                chunk = n_pages
+            while has_more_results and page_idx < n_pages:
+                page_indexes = range(page_idx, min(page_idx + chunk, n_pages))
+                pages = self._fetch_pages(page_indexes, limiter, session,
+                                          fetcher)
+                for i, results in itertools.izip(page_indexes, pages):
+                    if not self._scrape_page(i, results, checkpoint):
                         has_more_results = False
-                else:
-                    has_more_results = False
+                        break
+                    listed += results.listed
+                    page_idx = i + 1
+            if listed >= self.documents:
+                has_more_results = False
+
+        ## otherwise, page until there are no more results
+        while has_more_results:
+            results = Webpage(self.page_url(page_idx), limiter=limiter,
+                              session=session).results
+            if self._scrape_page(page_idx, results, checkpoint):
+                page_idx += 1
             else:
                 has_more_results = False
 
+        if checkpoint is not None:
+            checkpoint.finish(self.checkpoint_key, documents=self.documents,
+                              contexts=self.contexts)
+
+
+## frequent words of each subcorpus, used to find out its page size and
+## whether it honours alternations (see QueryPlanner.supports_alternation)
+PAGE_SIZE_PROBES = (
+    (RNCQueryAncient, {"lexi1": "быти"}),
+    (RNCQueryOld, {"req": "и"}),
+    (RNCQueryModern, {"lex1": "быть"}),
+    )
+
+def negotiate_page_size(query_class, probe_params, sizes=(100, 50, 20),
+                        base_url=None, session=None):
+    """Use the largest page size a subcorpus honours for all its queries.
+
+    Page 0 of a frequent word is requested with the largest of sizes as
+    dpp. If the server lists fewer documents than that while it found
+    more, it caps the page size, and the cap is used; sizes the server
+    rejects outright, or answers with a page that lists nothing, are
+    skipped.
+
+    Parameters
+    ----------
+      query_class: RNCQueryAncient, RNCQueryOld or RNCQueryModern
+      probe_params (dict): query arguments of a frequent word
+      sizes (tuple): page sizes to try, in documents per page
+      base_url (str): address of the server (default: query_class's)
+      session (HTTPSession): connection pool to use (default: SESSION)
+
+    Returns
+    -------
+      the page size now used by query_class, or None if none was accepted
+      (query_class is then left as it was)
+    """
+    for size in sorted(sizes, reverse=True):
+        query = query_class(dpp=size, **probe_params)
+        search = RNCSearch(rnc_query=query)
+        if base_url is not None:
+            search.base_url = base_url
+        search.base_search_url()
+        try:
+            results = Webpage(search.page_url(0), session=session).results
+        except HTTPError as e:
+            log.info(u"%s rejects %d documents per page: %s",
+                     query_class.__name__, size, e)
+            continue
+        if not results.listed:
+            log.info(u"%s lists nothing with %d documents per page.",
+                     query_class.__name__, size)
+            continue
+        if results.listed < size and results.documents > results.listed:
+            size = results.listed
+        query_class.default_dpp = size
+        log.info(u"%s: %d documents per page", query_class.__name__, size)
+        return size
+    return None
+
+def negotiate_page_sizes(query_classes=None, base_url=None, session=None):
+    """Set the page size of each kind of query (see negotiate_page_size).
+
+    Failures are logged, leaving the server's default page size in place.
+
+    Parameters
+    ----------
+      query_classes (list): the query classes to set (default: all three)
+      base_url, session: see negotiate_page_size
+    """
+    for query_class, probe_params in PAGE_SIZE_PROBES:
+        if query_classes is not None and query_class not in query_classes:
+            continue
+        try:
+            negotiate_page_size(query_class, probe_params, base_url=base_url,
+                                session=session)
+        except IOError as e:
+            log.warning(u"Cannot negotiate the page size of %s: %s",
+                        query_class.__name__, e)
+
+def modern_search(base_verb, full_verb, pfx_status, pfx_name, sfx_status,
+                  sfx=None, gramm_cat="praet", end_year=1899):
+    """Return an (unscraped) RNCSearch of the modern subcorpus for one verb.
+
+    Parameters
+    ----------
+      base_verb (unicode): simplex of the verb constellation
+      full_verb (unicode): the derived verb to search for
+      pfx_status, sfx_status (unicode): u'yes' or u'no'
+      pfx_name (unicode): 'standard' name of the prefix, e.g. u'nad-'
+      sfx (unicode): suffix of the verb, or None
+      gramm_cat (str): grammatical category to search for
+      end_year (int): limit searches to sources created prior to this year
+    """
+    query = RNCQueryModern(
+        lex1=full_verb.encode('utf-8'),
+        gramm1=gramm_cat.encode('utf-8'),
+        end_year=u"{}".format(end_year).encode('utf-8')
+    )
+    return RNCSearch(
+        rnc_query=query,
+        subcorpus=u"modern".encode('utf-8'),
+        pfx_val=pfx_status.encode('utf-8'),
+        prefix=(pfx_name or u"").encode('utf-8'),
+        sfx_val=sfx_status.encode('utf-8'),
+        ## the next line raises an AttributeError if sfx is None
+        #suffix=sfx.encode('utf-8'),
+        suffix=sfx,
+        lem=full_verb.encode('utf-8'),
+        gramm_cat=gramm_cat.encode('utf-8'),
+        base_verb=(base_verb or u"").encode('utf-8')
+        )
+
+## query parameter holding the searched word in each kind of RNC query
+TERM_PARAMS = ("lex1", "lexi1", "req")
+
+## combining acute and grave accents, which RNC shows on stressed vowels
+ACCENTS = re.compile(u"[\u0300\u0301]")
+
+class BatchQuery(object):
+    """Query of several word forms at once, built by QueryPlanner."""
+
+    def __init__(self, params, base_url):
+        self.params = params
+        self.base_url = base_url
+
+class QueryPlanner(object):
+    """Run searches of single word forms as few alternation queries.
+
+    Searches that differ only in their word form (e.g., the spellings of
+    one prefix) are merged into one query for 'form1|form2|...', which is
+    scraped once instead of once per form. Each source of the merged
+    results is then given back to the searches whose forms are highlighted
+    in its examples, which is only possible when the source shows all of
+    its examples: a sample, even one of a single form, says nothing
+    exact about the rest (e.g., a text may mix въз- and воз-).
+
+    A batch with a source that cannot be attributed this way is searched
+    again one form at a time, so no count is ever estimated. If the server
+    does not highlight hits at all, batching is switched off for the rest
+    of the run.
+
+    An empty merged query is only taken to mean that none of its forms
+    is used once the server is known to honour alternations.
+    """
+
+    def __init__(self, max_forms=10, max_term_length=500, fetcher=None):
+        """Set the size of the merged queries.
+
+        Parameters
+        ----------
+          max_forms (int): largest number of forms in one query
+          max_term_length (int): longest alternation, in bytes, that is sent
+            as one query term
+          fetcher (ConcurrentFetcher): fetch the pages of each query
+            concurrently (see RNCSearch.scrape_pages)
+        """
+        self.max_forms = max_forms
+        self.max_term_length = max_term_length
+        self.fetcher = fetcher
+        self.batching = True
+        ## (base url, term parameter) -> whether 'a|b' is honoured there
+        self.alternation = {}
+
+    def _term_param(self, search):
+        for name in TERM_PARAMS:
+            if search.params.get(name):
+                return name
+        return None
+
+    def _batch_key(self, search):
+        """Return what searches must share to be merged, or None."""
+        name = self._term_param(search)
+        if name is None:
+            return None
+        others = tuple(sorted((k, u"{}".format(to_unicode_or_bust(v)))
+                              for k, v in search.params.iteritems()
+                              if k != name))
+        return (search.base_url, search.subcorpus, search.gramm_cat, name,
+                others)
+
+    def plan(self, searches):
+        """Group consecutive searches that can be run as one query.
+
+        Parameters
+        ----------
+          searches (iterable): unscraped RNCSearch objects
+
+        Returns
+        -------
+          a generator of lists of RNCSearch objects
+        """
+        batch = []
+        batch_key = None
+        length = 0
+        for search in searches:
+            key = self._batch_key(search)
+            if key is None:
+                if batch:
+                    yield batch
+                yield [search]
+                batch = []
+                continue
+            term = to_unicode_or_bust(search.params[key[3]]).encode('utf-8')
+            if batch and (key != batch_key
+                          or len(batch) >= self.max_forms
+                          or length + len(term) + 1 > self.max_term_length):
+                yield batch
+                batch = []
+            if not batch:
+                batch_key = key
+                length = 0
+            batch.append(search)
+            length += len(term) + 1
+        if batch:
+            yield batch
+
+    def scrape(self, searches, limiter=None, session=None,
+               negative_cache=None):
+        """Scrape searches, merging them where possible.
+
+        Searches known to find nothing are left out of the merged queries.
+
+        Parameters
+        ----------
+          searches (iterable): unscraped RNCSearch objects
+          limiter, session, negative_cache: see RNCSearch.scrape_pages
+
+        Returns
+        -------
+          a generator of the searches, each one once it is scraped
+        """
+        if negative_cache is None:
+            negative_cache = NEGATIVE_CACHE
+        for batch in self.plan(searches):
+            empty, rest = self._prune(batch, negative_cache)
+            for search in empty:
+                search.scrape_pages(negative_cache=negative_cache)
+            if (len(rest) > 1 and self.batching and self._mergeable(rest[0])
+                    and self._scrape_batch(rest, limiter, session,
+                                           negative_cache)):
+                rest = []
+            for search in rest:
+                search.scrape_pages(limiter=limiter, session=session,
+                                    negative_cache=negative_cache,
+                                    fetcher=self.fetcher)
+            for search in batch:
+                yield search
+
+    def _match(self, hit, forms):
+        """Return the index of the form that hit is an instance of, or None.
+
+        A hit matches a form it spells out exactly. Failing that (e.g., a
+        past-tense hit of an infinitive lemma) it matches the form it has
+        the strictly longest common beginning with.
+        """
+        hit = ACCENTS.sub(u"", to_unicode_or_bust(hit)).strip().lower()
+        hit = hit.strip(u".,;:!?()[]\"'«»")
+        if hit in forms:
+            return forms.index(hit)
+        best, best_length, tie = None, 1, False
+        for i, form in enumerate(forms):
+            n = 0
+            for a, b in zip(hit, form):
+                if a != b:
+                    break
+                n += 1
+            if n > best_length:
+                best, best_length, tie = i, n, False
+            elif n == best_length:
+                tie = True
+        if tie:
+            return None
+        return best
+
+    def _forms(self, batch):
+        name = self._term_param(batch[0])
+        return [to_unicode_or_bust(s.params[name]).lower() for s in batch]
+
+    def merge(self, batch):
+        """Return one (unscraped) RNCSearch for all forms of a batch."""
+        params = dict(batch[0].params)
+        params[self._term_param(batch[0])] = u"|".join(
+            self._forms(batch)).encode('utf-8')
+        return RNCSearch(rnc_query=BatchQuery(params, batch[0].base_url),
+                         subcorpus=batch[0].subcorpus)
+
+    def _mergeable(self, search):
+        """Return False if the server of search ignores alternations."""
+        return self.alternation.get((search.base_url,
+                                     self._term_param(search)), True)
+
+    def supports_alternation(self, search, limiter=None, session=None):
+        """Return True if the server of search honours 'a|b' query terms.
+
+        This is found out once for each server and term parameter, by
+        searching for 'word|form', where word is a frequent word (see
+        PAGE_SIZE_PROBES) and form that of search. A server that reads the
+        alternation literally finds nothing.
+
+        Parameters
+        ----------
+          search (RNCSearch): a search of a single form
+          limiter, session: see RNCSearch.scrape_pages
+        """
+        name = self._term_param(search)
+        key = (search.base_url, name)
+        if key not in self.alternation:
+            frequent = dict(item for query_class, params in PAGE_SIZE_PROBES
+                            for item in params.iteritems())
+            params = dict(search.params)
+            params[name] = u"|".join([to_unicode_or_bust(frequent[name]),
+                                      self._forms([search])[0]]
+                                     ).encode('utf-8')
+            probe = RNCSearch(rnc_query=BatchQuery(params, search.base_url),
+                              subcorpus=search.subcorpus)
+            probe.base_search_url()
+            ## not probe.probe(), whose answer may come from a NegativeCache
+            results = Webpage(probe.page_url(0), limiter=limiter,
+                              session=session).results
+            self.alternation[key] = results.has_results
+            if not results.has_results:
+                log.warning(u"%s does not honour alternations in %s, so "
+                            u"its queries will not be merged.",
+                            search.base_url, name)
+        return self.alternation[key]
+
+    def probe(self, searches, limiter=None, session=None,
+              negative_cache=None):
+        """Find out which searches may find anything, fetching first pages.
+
+        Only the merged query of each batch is probed, so a batch of forms
+        that are never used costs one request. If the server turns out not
+        to honour alternations, the forms are probed one by one.
+
+        Parameters
+        ----------
+          searches (iterable): unscraped RNCSearch objects
+          limiter, session, negative_cache: see RNCSearch.probe
+
+        Returns
+        -------
+          a generator of (search, found) pairs; found is False if the
+          search finds nothing and True if it or another search of its
+          batch finds something
+        """
+        if negative_cache is None:
+            negative_cache = NEGATIVE_CACHE
+        for batch in self.plan(searches):
+            empty, batch = self._prune(batch, negative_cache)
+            for search in empty:
+                yield search, False
+            if not batch:
+                continue
+            found = None
+            if len(batch) > 1 and self._mergeable(batch[0]):
+                found = self.merge(batch).probe(
+                    limiter=limiter, session=session,
+                    negative_cache=negative_cache)
+                if not found and not self.supports_alternation(
+                        batch[0], limiter, session):
+                    found = None
+            if found is None:
+                for search in batch:
+                    yield search, search.probe(
+                        limiter=limiter, session=session,
+                        negative_cache=negative_cache)
+                continue
+            for search in batch:
+                if not found and negative_cache is not None:
+                    negative_cache.add(search.params)
+                yield search, found
+
+    def _prune(self, batch, negative_cache):
+        """Split batch into searches known to find nothing and the others."""
+        if negative_cache is None:
+            return [], batch
+        empty, rest = [], []
+        for search in batch:
+            if negative_cache.is_empty(search.params):
+                empty.append(search)
+            else:
+                rest.append(search)
+        return empty, rest
+
+    def _scrape_batch(self, batch, limiter=None, session=None,
+                      negative_cache=None):
+        """Scrape batch as one query and split the results between searches.
+
+        Returns
+        -------
+          True if every search of the batch got its results, False if the
+          searches have to be scraped one by one
+        """
+        forms = self._forms(batch)
+        merged = self.merge(batch)
+        merged.keep_hits = True
+        merged.scrape_pages(limiter=limiter, session=session,
+                            negative_cache=negative_cache,
+                            fetcher=self.fetcher)
+
+        rows = merged.all_search_results
+        if not rows:
+            if merged.documents != 0:
+                ## it found sources, but none with an "All N" link
+                return False
+            if not self.supports_alternation(batch[0], limiter, session):
+                return False
+            if negative_cache is not None:
+                for search in batch:
+                    negative_cache.add(search.params)
+        if rows and not any(row[15] for row in rows):
+            log.warning(u"Results show no highlighted hits, so queries "
+                        u"will no longer be merged.")
+            self.batching = False
+            return False
+
+        splits = []
+        for row in rows:
+            matches = [self._match(hit, forms) for hit in row[15]]
+            if None not in matches and len(matches) == row[13]:
+                counts = [matches.count(i) for i in range(len(batch))]
+            else:
+                ## a sample of examples says nothing exact about the rest
+                log.info(u"Cannot split results of %s by form.",
+                         merged.address)
+                return False
+            splits.append((row, counts))
+
+        for search in batch:
+            search.base_search_url()
+            search.documents = 0
+            search.contexts = 0
+        for row, shares in splits:
+            for search, examples in zip(batch, shares):
+                if examples:
+                    search.add_row(row[9], examples, row[14])
+                    search.documents += 1
+                    search.contexts += examples
+        return True
+
+## spellings of each verbal prefix, by prefix name
+PREFIXES = (
+    # path/location prefixes
+    ('o-', ('о', 'об', 'обо', 'объ')),
+    ('nad-', ('над', 'надо', 'надъ')),
+    ('pere-', ('пере', 'пре', 'прѣ')),
+    ('pro-', ('про',)),
+    ## the third spelling of u- is U+E072, a private-use glyph of the
+    ## corpus fonts, which most editors show as '' (it is not empty)
+    ('u-', ('у', 'ѹ', '', 'ꙋ')),
+    # goal prefixes
+    ('na-', ('на',)),
+    ('v-', ('в', 'во', 'въ')),
+    ('pri-', ('при',)),
+    ('za-', ('за',)),
+    ('do-', ('до',)),
+    ('pod-', ('под', 'подо', 'подъ')),
+    ('s-', ('с', 'со', 'съ')),
+    # source prefixes
+    ('iz-', ('из', 'изо', 'изъ')),
+    ('ot-', ('от', 'ото', 'отъ')),
+    ('voz-', (
+        'вз', 'вс', 'воз', 'вос', 'взо', 'взъ',
+        'возъ', 'въз', 'въс', 'възъ'
+        )),
+    ('raz-', ('раз', 'рас', 'разо', 'разъ')),
+    # po
+    ('vy-', ('вы',)),
+    ('po-', ('по',)),
+    )
+
+## PREFIXES plus the empty "prefix" ('—') of unprefixed verbs, listed
+## first so that the bare stem is searched for before its prefixed forms
+PREFIXES_WITH_NULL = (('—', ('',)),) + PREFIXES
+
+@lru_cache(maxsize=10000)
+def expand_prefixes(root):
+    """Return the forms of root with each prefix of PREFIXES_WITH_NULL.
+
+    Returns
+    -------
+      a tuple of (prefix name, forms) pairs, in the order of
+      PREFIXES_WITH_NULL; a form is only listed under its first prefix
+    """
+    seen = set()
+    expansion = []
+    for name, spellings in PREFIXES_WITH_NULL:
+        forms = []
+        for pfx in spellings:
+            form = pfx + root
+            if form not in seen:
+                seen.add(form)
+                forms.append(form)
+        expansion.append((name, tuple(forms)))
+    return tuple(expansion)
 
 class RussianVerb(object):
     """Russian verb object: provides namespace for possible forms."""
 
+    prefixes = PREFIXES
+    prefixes_with_null = PREFIXES_WITH_NULL
+
     def __init__(self, simplex_verb):
 
         self.root = simplex_verb
-        self.prefixed_forms = {}
-
-        self.prefixes = {
-            # path/location prefixes
-            'o-': ['о', 'об', 'обо', 'объ'],
-            'nad-': ['над', 'надо', 'надъ'],
-            'pere-': ['пере', 'пре', 'прѣ'],
-            'pro-': ['про'],
-            'u-': ['у', 'ѹ', '', 'ꙋ'],
-            # goal prefixes
-            'na-': ['на'],
-            'v-': ['в', 'во', 'въ'],
-            'pri-': ['при'],
-            'za-': ['за'],
-            'do-': ['до'],
-            'pod-': ['под', 'подо', 'подъ'],
-            's-': ['с', 'со', 'съ'],
-            # source prefixes
-            'iz-': ['из', 'изо', 'изъ'],
-            'ot-': ['от', 'ото', 'отъ'],
-            'voz-': [
-                'вз', 'вс', 'воз', 'вос', 'взо', 'взъ',
-                'возъ', 'въз', 'въс', 'възъ'
-                ],
-            'raz-': ['раз', 'рас', 'разо', 'разъ'],
-            # po
-            'vy-': ['вы'],
-            'po-': ['по'],
-            }
 
-        self.prefixes_with_null = self.prefixes
-        self.prefixes_with_null['—'] = ['']
+        ## (prefix name, forms) pairs, the unprefixed form under '—'
+        self.all_forms_by_prefix = expand_prefixes(simplex_verb)
+
+    @property
+    def prefixed_forms_by_prefix(self):
+        """(prefix name, forms) pairs of the prefixed forms only."""
+        return self.all_forms_by_prefix[1:]
+
+    @property
+    def prefixed_forms(self):
+        """All prefixed forms of the verb."""
+        return [form for name, forms in self.prefixed_forms_by_prefix
+                for form in forms]
+
+
+def _unique(items):
+    """Return the items as a tuple, without repeats, in their first order."""
+    seen = set()
+    unique = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique.append(item)
+    return tuple(unique)
+
+class OldFormSpace(object):
+    """Lazy space of prefix × stem × ending word forms for the old subcorpus.
 
-        self.prefixed_forms = []
-        for k, v in self.prefixes.iteritems():
-            for pfx in v:
-                self.prefixed_forms.append("{}{}".format(pfx, self.root))
+    Forms are generated one at a time and never stored. A form that can be
+    spelt in more than one way (e.g., with a different prefix spelling or
+    stem and ending split) is only generated for its first decomposition,
+    in iteration order, so every form is generated exactly once.
+    """
 
-        self.prefixed_forms_by_prefix = {}
-        for k, v in self.prefixes.iteritems():
-            forms = [pfx + self.root for pfx in v]
-            self.prefixed_forms_by_prefix[k] = forms
+    def __init__(self, stems_vowel, stems_consonant, postvowel_endings,
+                 postconsonant_endings, prefixes=PREFIXES_WITH_NULL):
+        """Describe the space; nothing is generated yet.
 
-        self.all_forms_by_prefix = self.prefixed_forms_by_prefix
-        self.all_forms_by_prefix['—'] = ['' + self.root]
+        Parameters
+        ----------
+          stems_vowel (list): stems that take postvowel_endings
+          stems_consonant (list): stems that take postconsonant_endings
+          postvowel_endings, postconsonant_endings (list): endings
+          prefixes (tuple): (prefix name, spellings) pairs, as PREFIXES
+        """
+        self.prefixes = tuple((name, pfx) for name, spellings in prefixes
+                              for pfx in _unique(spellings))
+        self.groups = ((_unique(stems_vowel), _unique(postvowel_endings)),
+                       (_unique(stems_consonant),
+                        _unique(postconsonant_endings)))
+
+        ## number of (prefix, stem, ending) combinations, known up front;
+        ## len() gives the exact number of distinct forms
+        self.size_bound = len(self.prefixes) * sum(
+            len(stems) * len(endings) for stems, endings in self.groups)
+        self._len = None
+
+        ## lookup tables to find every decomposition of a form
+        self.prefix_rank = {}
+        for rank, (name, pfx) in enumerate(self.prefixes):
+            self.prefix_rank.setdefault(pfx, rank)
+        self.prefix_lengths = sorted(set(len(p) for p in self.prefix_rank))
+        self.stem_rank = []
+        self.stem_lengths = []
+        self.ending_rank = []
+        for stems, endings in self.groups:
+            self.stem_rank.append(dict((s, i) for i, s in
+                                       enumerate(stems)))
+            self.stem_lengths.append(sorted(set(len(s) for s in stems)))
+            self.ending_rank.append(dict((e, i) for i, e in
+                                         enumerate(endings)))
+
+    def _first_decomposition(self, form):
+        """Return the position in iteration order where form first occurs."""
+        first = None
+        for length in self.prefix_lengths:
+            rank = self.prefix_rank.get(form[:length])
+            if rank is None:
+                continue
+            rest = form[length:]
+            for group in range(len(self.groups)):
+                stem_rank = self.stem_rank[group]
+                ending_rank = self.ending_rank[group]
+                for k in self.stem_lengths[group]:
+                    s = stem_rank.get(rest[:k])
+                    if s is None:
+                        continue
+                    e = ending_rank.get(rest[k:])
+                    if e is None:
+                        continue
+                    key = (rank, group, s, e)
+                    if first is None or key < first:
+                        first = key
+        return first
+
+    def iter_forms(self, shard=0, shards=1):
+        """Yield (prefix name, form) for each distinct form of the space.
 
+        Parameters
+        ----------
+          shard (int): which share of the space to yield, 0 <= shard < shards
+          shards (int): number of shares the space is split into; the
+            shards are disjoint and together yield the whole space
+        """
+        position = -1
+        for rank, (name, pfx) in enumerate(self.prefixes):
+            for group, (stems, endings) in enumerate(self.groups):
+                for s, stem in enumerate(stems):
+                    for e, ending in enumerate(endings):
+                        position += 1
+                        if position % shards != shard:
+                            continue
+                        form = pfx + stem + ending
+                        if (self._first_decomposition(form)
+                                == (rank, group, s, e)):
+                            yield name, form
+
+    def __iter__(self):
+        return self.iter_forms()
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(1 for pair in self.iter_forms())
+        return self._len
 
 class RNCSearchTerm(object):
     """Container object holding all (past-tense) forms of a search term."""
@@ -901,6 +3967,9 @@ class RNCSearchTerm(object):
         if suffix is not None:
             self.suffix = suffix
 
+        ## merges the searches of the prefix spellings of a form
+        self.planner = QueryPlanner()
+
         ## the ancient corpus needs both lemmas and grammatical categories
         self.ancient_forms = ['iperf', 'aor', 'perf', 'past']
         self.ancient_splx_ipf = [] # simplex imperfective lemmas
@@ -957,183 +4026,235 @@ class RNCSearchTerm(object):
         ]
 
     def get_old_forms(self, stem_list_vowel, stem_list_consonant):
-        # generate possible forms for the 'old' subcorpus
-        self.all_old_forms = []
-        for v_stem in stem_list_vowel:
-            for ending in self.old_postvowel_endings:
-                self.all_old_forms.append(v_stem + ending)
-        for c_stem in stem_list_consonant:
-            for ending in self.old_postconsonant_endings:
-                self.all_old_forms.append(c_stem + ending)
-
-    def search_ancient(self):
-        """Search the ancient subcorpus."""
-
-        for gramm_form in self.ancient_forms:
-            for verb_form in self.ancient_splx_ipf:
-                rv = RussianVerb(simplex_verb=verb_form)
-                for pfx, vb in rv.all_forms_by_prefix.iteritems():
-                    for v in vb:
-
-                        query = RNCQueryAncient(
-                            lexi1=v, gramm1=gramm_form
-                            )
-
-                        if pfx == "—":
-                            pfxv = "noPrefix"
-                        else:
-                            pfxv = "yesPrefix"
-
-                        try:
-                            if self.suffix is not None:
-                                sfxv = "yesSuffix"
-                                sfx = self.suffix
+        """Describe the possible (prefixed) forms for the 'old' subcorpus.
+
+        Returns
+        -------
+          an OldFormSpace, also kept as self.all_old_forms; its forms are
+          only generated as search_old() iterates over them
+        """
+        self.all_old_forms = OldFormSpace(
+            stems_vowel=stem_list_vowel,
+            stems_consonant=stem_list_consonant,
+            postvowel_endings=self.old_postvowel_endings,
+            postconsonant_endings=self.old_postconsonant_endings)
+        return self.all_old_forms
+
+    def write_search_results(self, search):
+        """Write the results of a scraped search to the spreadsheet."""
+
+        #if self.rs:
+        #    for d in search.all_search_results:
+        #        for i in range(d[13]):
+        #            self.rs.write_row(
+        #                row_idx=self.rw, dict_contents=d
+        #                )
+        #            self.rw += 1
+        if self.rs:
+            for d in search.all_search_results:
+                self.rs.write_row(
+                    row_idx=self.rw, dict_contents=d
+                    )
+                self.rw += 1
+            self.rs.write_dicts_to_txt(
+                search.all_search_results
+                )
+
+    def probe_lemmas(self, searches):
+        """Return the lemmas of those searches that find anything.
+
+        Each lemma is searched without a grammatical form, so the forms of
+        lemmas that are never used can be skipped (see QueryPlanner.probe).
+        """
+        return set(search.lem for search, found
+                   in self.planner.probe(searches) if found)
+
+    def search_ancient(self, probe=True):
+        """Search the ancient subcorpus.
+
+        Parameters
+        ----------
+          probe (bool): skip the grammatical forms of lemmas that the
+            subcorpus does not contain at all (see probe_lemmas)
+        """
+
+        if probe:
+            used = self.probe_lemmas(
+                RNCSearch(rnc_query=RNCQueryAncient(lexi1=v),
+                          subcorpus="Ancient", lem=v)
+                for verb_form in self.ancient_splx_ipf
+                for pfx, vb in RussianVerb(verb_form).all_forms_by_prefix
+                for v in vb)
+
+        def searches():
+            for gramm_form in self.ancient_forms:
+                for verb_form in self.ancient_splx_ipf:
+                    rv = RussianVerb(simplex_verb=verb_form)
+                    for pfx, vb in rv.all_forms_by_prefix:
+                        for v in vb:
+                            if probe and v not in used:
+                                continue
+
+                            query = RNCQueryAncient(
+                                lexi1=v, gramm1=gramm_form
+                                )
+
+                            if pfx == "—":
+                                pfxv = "noPrefix"
                             else:
+                                pfxv = "yesPrefix"
+
+                            try:
+                                if self.suffix is not None:
+                                    sfxv = "yesSuffix"
+                                    sfx = self.suffix
+                                else:
+                                    sfxv = "noSuffix"
+                                    sfx = ""
+                            except AttributeError as e:
+                                log.debug(u"AttributeError: %s", e)
                                 sfxv = "noSuffix"
                                 sfx = ""
-                        except AttributeError as e:
-                            print "AttributeError: {}".format(e)
-                            sfxv = "noSuffix"
-                            sfx = ""
-
-                        search = RNCSearch(
-                            rnc_query=query, subcorpus="Ancient",
-                            pfx_val=pfxv, prefix=pfx,
-                            sfx_val=sfxv, suffix=sfx,
-                            lem=v, gramm_cat=gramm_form,
-                            base_verb=verb_form
-                            )
-                        search.scrape_pages()
-
-                        #if self.rs:
-                        #    for d in search.all_search_results:
-                        #        for i in range(d[13]):
-                        #            self.rs.write_row(
-                        #                row_idx=self.rw, dict_contents=d
-                        #                )
-                        #            self.rw += 1
-                        if self.rs:
-                            for d in search.all_search_results:
-                                self.rs.write_row(
-                                    row_idx=self.rw, dict_contents=d
-                                    )
-                                self.rw += 1
-                            self.rs.write_dicts_to_txt(
-                                search.all_search_results
+
+                            yield RNCSearch(
+                                rnc_query=query, subcorpus="Ancient",
+                                pfx_val=pfxv, prefix=pfx,
+                                sfx_val=sfxv, suffix=sfx,
+                                lem=v, gramm_cat=gramm_form,
+                                base_verb=verb_form
                                 )
 
-    def search_old(self):
-        """Search the old subcorpus."""
+        ## the prefix spellings of a verb are searched together
+        for search in self.planner.scrape(searches()):
+            self.write_search_results(search)
 
-        for verb_form in self.all_old_forms:
-            rv = RussianVerb(simplex_verb=verb_form)
-            for pfx, vb in rv.all_forms_by_prefix.iteritems():
-                for v in vb:
-                    query = RNCQueryOld(
-                        req=v
-                        )
+    def search_old(self, shard=0, shards=1):
+        """Search the old subcorpus.
 
-                    if pfx == "—":
-                        pfxv = "noPrefix"
-                    else:
-                        pfxv = "yesPrefix"
+        Parameters
+        ----------
+          shard, shards (int): only search this share of the old forms (see
+            OldFormSpace.iter_forms), e.g., to split a crawl between machines
+        """
 
-                    try:
-                        if self.suffix is not None:
-                            sfxv = "yesSuffix"
-                            sfx = self.suffix
-                        else:
-                            sfxv = "noSuffix"
-                            sfx = ""
-                    except AttributeError as e:
-                        print "AttributeError: {}".format(e)
+        log.info(u"Searching shard %d of %d of at most %d old forms.",
+                 shard, shards, self.all_old_forms.size_bound)
+
+        def searches():
+            for pfx, v in self.all_old_forms.iter_forms(shard, shards):
+                query = RNCQueryOld(
+                    req=v
+                    )
+
+                if pfx == "—":
+                    pfxv = "noPrefix"
+                else:
+                    pfxv = "yesPrefix"
+
+                try:
+                    if self.suffix is not None:
+                        sfxv = "yesSuffix"
+                        sfx = self.suffix
+                    else:
                         sfxv = "noSuffix"
                         sfx = ""
+                except AttributeError as e:
+                    log.debug(u"AttributeError: %s", e)
+                    sfxv = "noSuffix"
+                    sfx = ""
+
+                yield RNCSearch(
+                    rnc_query=query, subcorpus="Old",
+                    pfx_val=pfxv, prefix=pfx,
+                    sfx_val=sfxv, suffix=sfx,
+                    lem=v, base_verb=self.old_inf
+                    )
+
+        for search in self.planner.scrape(searches()):
+            self.write_search_results(search)
+
+    def search_modern(self, probe=True):
+        """Search the modern subcorpus.
 
-                    search = RNCSearch(
-                        rnc_query=query, subcorpus="Old",
-                        pfx_val=pfxv, prefix=pfx,
-                        sfx_val=sfxv, suffix=sfx,
-                        lem=v, base_verb=self.old_inf
-                        )
-                    search.scrape_pages()
-
-                    #if self.rs:
-                    #    for d in search.all_search_results:
-                    #        for i in range(d[13]):
-                    #            self.rs.write_row(
-                    #                row_idx=self.rw, dict_contents=d
-                    #                )
-                    #            self.rw += 1
-                    if self.rs:
-                        for d in search.all_search_results:
-                            self.rs.write_row(
-                                row_idx=self.rw, dict_contents=d
+        Parameters
+        ----------
+          probe (bool): skip the grammatical forms of lemmas that the
+            subcorpus does not contain at all (see probe_lemmas)
+        """
+
+        if probe:
+            used = self.probe_lemmas(
+                RNCSearch(rnc_query=RNCQueryModern(lex1=v, end_year=1799),
+                          subcorpus="Modern", lem=v)
+                for verb_form in self.modern_splx_ipf
+                for pfx, vb in RussianVerb(verb_form).all_forms_by_prefix
+                for v in vb)
+
+        def searches():
+            for gramm_form in self.modern_forms:
+                for verb_form in self.modern_splx_ipf:
+                    rv = RussianVerb(simplex_verb=verb_form)
+                    for pfx, vb in rv.all_forms_by_prefix:
+                        for v in vb:
+                            if probe and v not in used:
+                                continue
+                            query = RNCQueryModern(
+                                lex1=v, gramm1=gramm_form, end_year=1799
                                 )
-                            self.rw += 1
-                        self.rs.write_dicts_to_txt(
-                            search.all_search_results
-                            )
-
-
-    def search_modern(self):
-        """Search the modern subcorpus."""
-
-        for gramm_form in self.modern_forms:
-            for verb_form in self.modern_splx_ipf:
-                rv = RussianVerb(simplex_verb=verb_form)
-                for pfx, vb in rv.all_forms_by_prefix.iteritems():
-                    for v in vb:
-                        query = RNCQueryModern(
-                            lex1=v, gramm1=gramm_form, end_year=1799
-                            )
-
-                        if pfx == "—":
-                            pfxv = "noPrefix"
-                        else:
-                            pfxv = "yesPrefix"
-
-                        try:
-                            if self.suffix is not None:
-                                sfxv = "yesSuffix"
-                                sfx = self.suffix
+
+                            if pfx == "—":
+                                pfxv = "noPrefix"
                             else:
+                                pfxv = "yesPrefix"
+
+                            try:
+                                if self.suffix is not None:
+                                    sfxv = "yesSuffix"
+                                    sfx = self.suffix
+                                else:
+                                    sfxv = "noSuffix"
+                                    sfx = ""
+                            except AttributeError as e:
+                                log.debug(u"AttributeError: %s", e)
                                 sfxv = "noSuffix"
                                 sfx = ""
-                        except AttributeError as e:
-                            print "AttributeError: {}".format(e)
-                            sfxv = "noSuffix"
-                            sfx = ""
-
-                        search = RNCSearch(
-                            rnc_query=query, subcorpus="Modern",
-                            pfx_val=pfxv, prefix=pfx,
-                            sfx_val=sfxv, suffix=sfx,
-                            lem=v, gramm_cat=gramm_form,
-                            base_verb=verb_form
-                            )
-
-                        search.scrape_pages()
-
-                        #if self.rs:
-                        #    for d in search.all_search_results:
-                        #        for i in range(d[13]):
-                        #            self.rs.write_row(
-                        #                row_idx=self.rw, dict_contents=d
-                        #                )
-                        #            self.rw += 1
-                        if self.rs:
-                            for d in search.all_search_results:
-                                self.rs.write_row(
-                                    row_idx=self.rw, dict_contents=d
-                                    )
-                                self.rw += 1
-                            self.rs.write_dicts_to_txt(
-                                search.all_search_results
+
+                            yield RNCSearch(
+                                rnc_query=query, subcorpus="Modern",
+                                pfx_val=pfxv, prefix=pfx,
+                                sfx_val=sfxv, suffix=sfx,
+                                lem=v, gramm_cat=gramm_form,
+                                base_verb=verb_form
                                 )
 
-    def search_all(self):
-        """Perform an RNCSearch for each possible word in the RNCSearchTerm."""
+        for search in self.planner.scrape(searches()):
+            self.write_search_results(search)
+
+    def search_all(self, page_workers=4):
+        """Perform an RNCSearch for each possible word in the RNCSearchTerm.
+
+        The pages of each query are fetched by a ConcurrentFetcher with
+        page_workers threads (page_workers=None fetches them one by one).
+
+        Queries that find nothing are remembered in thrunc_empty.db (unless
+        NEGATIVE_CACHE is already set), so no later run sends them again,
+        and fetched pages are cached in thrunc_cache.db (unless
+        RESPONSE_CACHE is already set; see CACHE_MAX_BYTES and CACHE_TTL).
+
+        Warnings and progress are logged; call configure_logging() first
+        to see them.
+        """
+        global NEGATIVE_CACHE, RESPONSE_CACHE
+        if NEGATIVE_CACHE is None:
+            NEGATIVE_CACHE = NegativeCache()
+        if RESPONSE_CACHE is None:
+            RESPONSE_CACHE = ResponseCache(ttl=CACHE_TTL,
+                                           max_bytes=CACHE_MAX_BYTES)
+        if page_workers:
+            self.planner.fetcher = ConcurrentFetcher(workers=page_workers)
+
+        ## ask for as many documents per page as each subcorpus allows
+        negotiate_page_sizes()
 
         ## search all three subcorpora
         self.search_ancient()
@@ -1143,46 +4264,74 @@ class RNCSearchTerm(object):
         ## save the results spreadsheet to disk
         self.rs.save_wb()
 
+def load_verb_pairs(conn, verb_list, batch_size=10000):
+    """Bulk-load a verb-pair list into the verbs table of a SQLite database.
+
+    The file is read line by line and inserted with executemany in a single
+    transaction, so lists of any length load at tens of thousands of rows
+    per second. Lines with fewer than three fields are logged and skipped.
+
+    Parameters
+    ----------
+      conn (sqlite3.Connection): database to load into
+      verb_list (str): name of a utf-8 text file with one
+        'ipfVerb;pfVerb;prefix' line per pair ('#' lines are comments)
+      batch_size (int): number of rows passed to each executemany call
+
+    Returns
+    -------
+      the number of rows inserted
+    """
+    conn.execute(u"CREATE TABLE IF NOT EXISTS verbs (ID INT, unix REAL, "
+                 u"dateStamp TEXT, ipfVerb TEXT, pfVerb TEXT, prefix TEXT)")
+    idx = conn.execute(u"SELECT COALESCE(MAX(ID), 0) FROM verbs").fetchone()[0]
+    sql_insert = u"INSERT INTO verbs VALUES (?, ?, ?, ?, ?, ?)"
+    n = 0
+    with conn:
+        with codecs.open(verb_list, mode="r", encoding="utf-8") as stream:
+            batch = []
+            for line_number, line in enumerate(stream, 1):
+                line = line.rstrip(u"\r\n")
+                if not line or line.startswith(u"#"):
+                    continue
+                parts = line.split(u";")
+                if len(parts) < 3:
+                    log.warning(u"Skipping line %d of %s, which is not "
+                                u"'ipfVerb;pfVerb;prefix': %s", line_number,
+                                verb_list, line)
+                    continue
+                idx += 1
+                batch.append((idx, 100, u'2015-09-15',
+                              parts[0], parts[1], parts[2]))
+                if len(batch) >= batch_size:
+                    conn.executemany(sql_insert, batch)
+                    n += len(batch)
+                    batch = []
+            conn.executemany(sql_insert, batch)
+            n += len(batch)
+        ## indexing once after the load is cheaper than on every insert
+        for column in [u"prefix", u"ipfVerb", u"pfVerb"]:
+            conn.execute(u"CREATE INDEX IF NOT EXISTS verbs_{0} ON verbs "
+                         u"({0})".format(column))
+    return n
+
 def main():
     db_name = u"verbpairs.db"
     conn = sqlite3.connect(db_name)
     crsr = conn.cursor()
-    try:
-        crsr.execute(u"CREATE TABLE verbs (ID INT, unix REAL, dateStamp TEXT," \
-                     u" ipfVerb TEXT, pfVerb TEXT, prefix TEXT)")
-    except sqlite3.OperationalError as e:
-        print u"OperationalError: {}".format(e)
-        pass
 
-    idx = 0
     verb_list = u"verbpairs.txt"
-    with codecs.open(verb_list, mode="r", encoding="utf-8") as stream:
-        all_lines = stream.read().split(u"\n")
-        for line in all_lines[:100]:
-            if not line.startswith(u"#"):
-                idx += 1
-                parts = line.split(u";")
-                #print u"{} ==========".format(idx)
-                #print u"IPF verb:\n\t{}".format(parts[0])
-                #print u"PF verb:\n\t{}".format(parts[1])
-                #print u"Prefix:\n\t{}-".format(parts[2])
-                crsr.execute(
-                    u"INSERT INTO verbs VALUES ({}, {}, '{}', " \
-                    u"'{}', '{}', '{}')".format(idx, 100, u'2015-09-15',
-                    parts[0],
-                    parts[1],
-                    parts[2])
-                    )
-                conn.commit()
-                print u"{};{};{};{}".format(
-                    idx, parts[0], parts[1], parts[2]
-                    )
-        sql_get = u"SELECT * FROM verbs WHERE prefix =?"
-        pfx = u"вз"
-        for row in crsr.execute(sql_get, [(pfx)]):
-            for itm in row:
-                print u"{}, ".format(itm),
-            print u""
+    start = time.time()
+    n = load_verb_pairs(conn, verb_list)
+    print u"Loaded {} verb pairs in {:.1f} seconds.".format(
+        n, time.time() - start)
+
+    sql_get = u"SELECT * FROM verbs WHERE prefix =?"
+    pfx = u"вз"
+    for row in crsr.execute(sql_get, [(pfx)]):
+        for itm in row:
+            print u"{}, ".format(itm),
+        print u""
 
 def main_two():
     x = SearchList(file_name='xmltest.xml')
@@ -1192,9 +4341,9 @@ def main_two():
 def build_xml_search_list(xml_name):
     xl = SearchList(file_name=xml_name)
     if xl.exists == True:
-        print "SearchList exists!"
+        log.info(u"SearchList exists!")
     if xl.exists == False:
-        print "SearchList doesn't exist, so we're creating one."
+        log.info(u"SearchList doesn't exist, so we're creating one.")
     xl.check()
     for p in [u'по', u'вз', u'под', u'с', u'пере']:
         base_verb = u"делать"
@@ -1214,37 +4363,91 @@ def build_xml_search_list(xml_name):
 def create_real_search_list(xml_name):
     """Build an XML search list from RussianVerb objects."""
     verbs = ["читать", "читывать", "читаться", "читываться"]
-    for verb in verbs:
-        rv = RussianVerb(simplex_verb=verb)
-        for pfx_name, pfx_list in rv.prefixes.iteritems():
-            for pfx in pfx_list:
-                sl = SearchList(file_name=xml_name)
-                sl.add_search_to_list(
-                    #base_verb=to_unicode_or_bust(rv.root),
-                    derived_verb=to_unicode_or_bust(pfx + rv.root),
-                    dv_pfx=to_unicode_or_bust(pfx),
-                    dv_pfx_name=to_unicode_or_bust(pfx_name)
-                )
-                # sl.check()
-                sl.write()
-
-def run_for_real(xml_name):
-    more_searches = True
-    while more_searches:
-        s = SearchList(file_name=xml_name)
-        for bv in s.root.findall(u'baseVerb'):
-            for dvc in bv.findall(u'derivedVerbCluster'):
-                for dv in bv.findall(u'derivedVerb'):
-                    if dv.find(u'query').get(u'successful') == u'no':
-                        s.search_modern(bv=bv, dv=dv)
-                        s.write()
-                        time.sleep(5)
-
-        if all(e.get(u'successful') == u'yes' for e in s.root.findall(
-                u'baseVerb/derivedVerbCluster/derivedVerb/query')):
-            more_searches = False
+
+    def searches():
+        for verb in verbs:
+            rv = RussianVerb(simplex_verb=verb)
+            for pfx_name, pfx_list in rv.prefixes_with_null:
+                for pfx in pfx_list:
+                    yield dict(
+                        #base_verb=to_unicode_or_bust(rv.root),
+                        derived_verb=to_unicode_or_bust(pfx + rv.root),
+                        dv_pfx=to_unicode_or_bust(pfx),
+                        dv_pfx_name=to_unicode_or_bust(pfx_name)
+                    )
+
+    with SearchList(file_name=xml_name) as sl:
+        sl.add_searches(searches())
+        # sl.check()
+
+def run_for_real(xml_name, streaming=False, workers=None, negotiate=True,
+                 page_workers=4):
+    """Run every pending query of a search list (.xml or SQLite .db).
+
+    Without workers, the queries are run one at a time, and the pages of
+    each are fetched by a ConcurrentFetcher with page_workers threads
+    (page_workers=None fetches them one by one).
+
+    With workers=N the queries are run by a CrawlScheduler on N threads.
+    An XML list is first imported into a queue database next to it
+    (xml_name + '.queue.db'), which keeps the crawl resumable, and the
+    results are exported back to the XML file at the end.
+
+    With streaming=True an XML list is processed by StreamingSearchList,
+    which never holds the whole file in memory.
+
+    Scraped pages are checkpointed in xml_name + '.pages.db', so a query
+    interrupted halfway resumes from its last completed page, and queries
+    that find nothing are remembered in xml_name + '.empty.db', so no
+    later run sends them again. Fetched pages are cached in
+    xml_name + '.cache.db' (see CACHE_MAX_BYTES and CACHE_TTL).
+
+    With negotiate=True the largest page size the modern subcorpus accepts
+    is found first (see negotiate_page_size).
+
+    Warnings and progress are logged; call configure_logging() first to
+    see them.
+    """
+    global PAGE_CHECKPOINT, NEGATIVE_CACHE, RESPONSE_CACHE
+    if RESPONSE_CACHE is None:
+        RESPONSE_CACHE = ResponseCache(file_name=xml_name + ".cache.db",
+                                       ttl=CACHE_TTL,
+                                       max_bytes=CACHE_MAX_BYTES)
+    if PAGE_CHECKPOINT is None:
+        PAGE_CHECKPOINT = PageCheckpoint(file_name=xml_name + ".pages.db")
+    if NEGATIVE_CACHE is None:
+        NEGATIVE_CACHE = NegativeCache(file_name=xml_name + ".empty.db")
+    if negotiate:
+        negotiate_page_sizes(query_classes=[RNCQueryModern])
+
+    if workers is not None:
+        if xml_name.endswith(".db"):
+            CrawlScheduler(xml_name, workers=workers).run()
+            return
+        queue_name = xml_name + ".queue.db"
+        with SQLiteSearchList(file_name=queue_name) as queue:
+            queue.import_xml(xml_name)
+        CrawlScheduler(queue_name, workers=workers).run()
+        with SQLiteSearchList(file_name=queue_name) as queue:
+            queue.export_xml(xml_name)
+        return
+
+    if xml_name.endswith(".db"):
+        search_list = SQLiteSearchList(file_name=xml_name)
+    elif streaming:
+        search_list = StreamingSearchList(file_name=xml_name)
+    else:
+        search_list = SearchList(file_name=xml_name, checkpoint_every=10)
+    fetcher = None
+    if page_workers:
+        fetcher = ConcurrentFetcher(workers=page_workers)
+    with search_list as s:
+        for bv, dv in s.pending_queries():
+            ## search_modern() checkpoints the list
+            s.search_modern(bv=bv, dv=dv, fetcher=fetcher)
 
 if __name__ == "__main__":
+    configure_logging()
     #main_two()
     #build_xml_search_list(xml_name="test_search_list.xml")
     xml_fn = "withcluster_test.xml"